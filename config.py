@@ -1,7 +1,15 @@
+import atexit
+import copy
 import json
 import os
+import threading
+import time
+from contextlib import contextmanager
+from types import MappingProxyType
 
+from utils.fs import atomic_write
 from utils.logger import log_event
+from utils.state_store import StateStore
 
 # ── Base paths ──────────────────────────────
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -12,6 +20,7 @@ INTERFACE_DIR = os.path.join(ASSETS_DIR, "interface")
 DOODLES_DIR = os.path.join(ICONS_DIR, "doodles")
 
 COMFYUI_PORT = 8188
+INSTANCE_PORT_SPAN = 100  # extra instances get a free port above COMFYUI_PORT
 
 # ── Waiting parameters ────────────────────────
 CHECK_INTERVAL = 1
@@ -96,55 +105,318 @@ USER_CONFIG_PATH = os.path.join(BASE_DIR, "user_config.json")
 DEFAULT_USER_CONFIG = {
     "ask_on_exit": True,
     "exit_mode": "always_stop",
-    "browser_patch_registry": {},
     "builds": [],
-    "last_used_build_id": "",
     "startup_mode": "cpu",  # cpu/gpu/nvidia (потом привяжешь к настройкам)
     "ui": {
         "show_manager_on_start": True,
     },
-    "update_etag": None,
-    "last_update_check": None,
     "update_interval_hours": 48,
     "updates_enabled": True,
+    "console_memory_mb": 8,
+    "console_spill_to_disk": True,
+    "log_max_mb": 5,
+    "log_max_age_days": 30,
+    "log_keep_files": 5,
+    "log_compress": True,
+    "stop_terminate_timeout": 5,
+    "restart_finish_job": False,
+    "restart_drain_timeout": 120,
 }
 
+# Runtime state lives in StateStore (utils/state_store.py); configs written by
+# older versions still carry it and hand it over on first read.
+RUNTIME_STATE_KEYS = ("update_etag", "last_update_check", "last_used_build_id")
 
-def load_user_config():
-    if not os.path.exists(USER_CONFIG_PATH):
-        save_user_config(DEFAULT_USER_CONFIG)
-        return DEFAULT_USER_CONFIG.copy()
 
+# ── Cached config document ─────────────────────────
+# user_config.json is parsed (and migrated) once, then reused for as long as
+# its stat signature (mtime, size) stays the same. Writes made through
+# save_user_config() refresh the cache directly; any other writer changes the
+# signature and triggers a reparse on the next read.
+_config_lock = threading.RLock()
+_config_cache: dict | None = None
+_config_sig: tuple | None = None
+_config_frozen = None
+
+# ── Config writer ─────────────────────────────────
+# save_user_config() only replaces the cached document and wakes a single
+# writer thread. The writer waits until a burst of saves has settled, then
+# writes the latest document once — to a temp file that is renamed over
+# user_config.json, so the file on disk is never half-written. Until then
+# the cache is newer than the file and is not revalidated against it.
+WRITE_DEBOUNCE_S = 0.3  # quiet time that ends a burst
+WRITE_MAX_DELAY_S = 2.0  # a steady stream of saves still hits disk this often
+WRITE_RETRY_S = 1.0  # first retry after a failed write, doubling up to…
+WRITE_RETRY_MAX_S = 60.0
+
+_write_cond = threading.Condition(_config_lock)
+_write_lock = threading.Lock()  # one file write at a time (writer thread vs flush)
+_pending_gen = 0  # bumped by every save
+_written_gen = 0  # generation that is on disk
+_dirty_since = 0.0
+_last_change = 0.0
+_config_writer: threading.Thread | None = None
+_writer_closed = False
+_write_failures = 0  # failed writes in a row
+_flush_due = False  # defaults installed with no writer: flush once the lock is free
+
+
+def _config_signature() -> tuple | None:
+    try:
+        st = os.stat(USER_CONFIG_PATH)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _parse_user_config() -> dict:
     try:
         with open(USER_CONFIG_PATH, "r", encoding="utf-8") as f:
             data = json.load(f)
+    except Exception:
+        return copy.deepcopy(DEFAULT_USER_CONFIG)
+    if not isinstance(data, dict):
+        return copy.deepcopy(DEFAULT_USER_CONFIG)
+    # Outside the fallback above: a migration problem must never turn a
+    # readable config into defaults (the next save would overwrite it)
+    return _migrate(data)
 
-        # 1) Дефолты верхнего уровня
-        for key, val in DEFAULT_USER_CONFIG.items():
-            data.setdefault(key, val)
 
-        # 2) Миграция: startup_mode внутри каждого build
-        global_mode = data.get("startup_mode", DEFAULT_USER_CONFIG["startup_mode"])
-        for b in data.get("builds") or []:
-            if isinstance(b, dict):
-                b.setdefault("startup_mode", global_mode)
+def _migrate(data: dict) -> dict:
+    # 1) Дефолты верхнего уровня
+    for key, val in DEFAULT_USER_CONFIG.items():
+        data.setdefault(key, copy.deepcopy(val))
 
-        return data
+    # 2) Миграция: startup_mode внутри каждого build
+    global_mode = data.get("startup_mode", DEFAULT_USER_CONFIG["startup_mode"])
+    for b in data.get("builds") or []:
+        if isinstance(b, dict):
+            b.setdefault("startup_mode", global_mode)
 
-    except Exception:
-        return DEFAULT_USER_CONFIG.copy()
+    # 3) Миграция: runtime state -> StateStore
+    _move_runtime_state(data)
 
+    return data
 
-def save_user_config(data: dict):
+
+def _move_runtime_state(data: dict):
+    # superseded by the patch engine's own per-file state (core/patches.py)
+    data.pop("browser_patch_registry", None)
+    present = {k: data[k] for k in RUNTIME_STATE_KEYS if data.get(k)}
+    if not present:
+        return
     try:
-        with open(USER_CONFIG_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=4, ensure_ascii=False)
+        # Values already in the store are newer than a leftover in the file
+        moved = {k: v for k, v in present.items() if not StateStore.has(k)}
+        if moved and not StateStore.set_many(moved):
+            return  # kept in the config; moved on a later start
     except Exception as e:
-        print(f"⚠️ Failed to save config: {e}")
-        log_event(f"⚠️ Failed to save config: {e}")
+        log_event(f"⚠️ Runtime state not migrated, kept in the config: {e}")
+        return
+    for key in RUNTIME_STATE_KEYS:
+        data.pop(key, None)
+
+
+def _cached_user_config() -> dict:
+    """The shared parsed document — never hand it out without copying."""
+    global _config_cache, _config_sig, _config_frozen, _flush_due
+    with _config_lock:
+        if _pending_gen != _written_gen and _config_cache is not None:
+            return _config_cache  # newer than the file until the writer runs
+
+        sig = _config_signature()
+        if sig is None:
+            # First run (or the file was deleted): write the defaults. The
+            # caller holds the config lock, so a flush is left to it.
+            if not _replace_config_locked(DEFAULT_USER_CONFIG):
+                _flush_due = True
+            return _config_cache
+
+        if _config_cache is None or sig != _config_sig:
+            _config_cache = _parse_user_config()
+            _config_sig = sig
+            _config_frozen = None
+        return _config_cache
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def load_user_config() -> dict:
+    """Returns a private, mutable copy of the user config (for read-modify-write)."""
+    with _config_lock:
+        data = copy.deepcopy(_cached_user_config())
+    _flush_if_due()
+    return data
+
+
+def config_snapshot():
+    """
+    Returns a read-only view of the user config (dicts become mappings,
+    lists become tuples). Cheap to call repeatedly: it is rebuilt only when
+    the file changes.
+    """
+    global _config_frozen
+    with _config_lock:
+        data = _cached_user_config()
+        if _config_frozen is None:
+            _config_frozen = _freeze(data)
+        frozen = _config_frozen
+    _flush_if_due()
+    return frozen
+
+
+def save_user_config(data: dict):
+    """
+    Makes `data` the current config. Readers see it at once; the file is
+    written shortly after by the config writer, coalesced with any other
+    saves of the same burst.
+    """
+    with _config_lock:
+        queued = _replace_config_locked(data)
+    if not queued:
+        flush_user_config()
+
+
+def _replace_config_locked(data: dict) -> bool:
+    """Installs `data` as the config (lock held); False if it must be flushed."""
+    global _config_cache, _config_frozen
+    _config_cache = _migrate(copy.deepcopy(data))
+    _config_frozen = None
+    return _mark_dirty()
+
+
+@contextmanager
+def config_transaction():
+    """
+    Read-modify-write under the config lock:
+
+        with config_transaction() as cfg:
+            cfg["builds"].append(build)
+
+    `cfg` is a copy of the latest config; it is saved once when the block
+    ends, or dropped if the block raises. Keep the block short — no dialogs
+    or network calls — since every other reader and writer waits for it.
+    """
+    with _config_lock:
+        cfg = copy.deepcopy(_cached_user_config())
+        yield cfg
+        queued = _replace_config_locked(cfg)
+    # flushed after the config lock is released: flush takes the write lock
+    # first, so taking it while holding the config lock could deadlock
+    if not queued:
+        flush_user_config()
+    else:
+        _flush_if_due()
+
+
+def update_config(fn):
+    """Applies `fn(cfg)` in a config_transaction() and returns its result."""
+    with config_transaction() as cfg:
+        return fn(cfg)
+
+
+def _flush_if_due():
+    """Flushes defaults that _cached_user_config() installed without a writer."""
+    if _flush_due:
+        flush_user_config()
+
+
+def flush_user_config() -> bool:
+    """Writes a pending config change right away. Returns False if it failed."""
+    global _written_gen, _config_sig, _write_failures, _flush_due
+    _flush_due = False  # whatever is pending is written (or retried) here
+    with _write_lock:
+        with _config_lock:
+            if _pending_gen == _written_gen:
+                return True
+            gen = _pending_gen
+            text = json.dumps(_config_cache, indent=4, ensure_ascii=False)
+
+        try:
+            atomic_write(USER_CONFIG_PATH, text)
+        except OSError as e:
+            _write_failures += 1
+            if _write_failures == 1:  # once per failure streak, not per retry
+                print(f"⚠️ Failed to save config: {e}")
+                log_event(f"⚠️ Failed to save config: {e}")
+            return False
+
+        if _write_failures:
+            log_event(f"✅ Config saved after {_write_failures} failed attempt(s).")
+            _write_failures = 0
+        with _config_lock:
+            _written_gen = gen
+            if gen == _pending_gen:
+                _config_sig = _config_signature()
+        return True
+
+
+def _mark_dirty() -> bool:
+    """Registers a change (lock held). False if it has to be written synchronously."""
+    global _pending_gen, _dirty_since, _last_change
+    now = time.monotonic()
+    if _pending_gen == _written_gen:
+        _dirty_since = now
+    _pending_gen += 1
+    _last_change = now
+    if _writer_closed or not _ensure_config_writer():
+        return False
+    _write_cond.notify()
+    return True
+
+
+def _ensure_config_writer() -> bool:
+    global _config_writer
+    if _config_writer is not None and _config_writer.is_alive():
+        return True
+    try:
+        _config_writer = threading.Thread(
+            target=_config_writer_loop, name="config-writer", daemon=True
+        )
+        _config_writer.start()
+        return True
+    except RuntimeError:
+        _config_writer = None
+        return False
+
+
+def _config_writer_loop():
+    while True:
+        with _write_cond:
+            while _pending_gen == _written_gen:
+                _write_cond.wait()
+            # Let the burst settle, but do not hold a change back forever
+            while True:
+                due = min(
+                    _last_change + WRITE_DEBOUNCE_S, _dirty_since + WRITE_MAX_DELAY_S
+                )
+                remaining = due - time.monotonic()
+                if remaining <= 0 or _pending_gen == _written_gen:
+                    break
+                _write_cond.wait(remaining)
+
+        if not flush_user_config():
+            # back off while the file stays unwritable (read-only, locked by AV)
+            time.sleep(
+                min(WRITE_RETRY_S * 2 ** (_write_failures - 1), WRITE_RETRY_MAX_S)
+            )
+
+
+def _close_config_writer():
+    global _writer_closed
+    _writer_closed = True  # later saves are written synchronously
+    flush_user_config()
+
+
+atexit.register(_close_config_writer)
 
 
 def get_comfyui_path() -> str:
     """Returns the current path to ComfyUI (from user_config.json or default)."""
-    data = load_user_config()
-    return data.get("comfyui_path", "")
+    return config_snapshot().get("comfyui_path", "")
@@ -0,0 +1,228 @@
+import hashlib
+import io
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable
+
+from utils.fs import atomic_write
+from utils.logger import log_event
+from utils.state_store import StateStore
+
+PATCH_MARK = "  # patched by ComfyLauncher"
+
+
+@dataclass(frozen=True)
+class Patch:
+    """
+    One named, idempotent edit of a file inside a ComfyUI build. All
+    callables work on the decoded text; the engine does the file I/O.
+    """
+
+    name: str
+    file: str  # relative to the build folder
+    description: str
+    needed: Callable[[str], bool]  # the unpatched target is present
+    applied: Callable[[str], bool]  # already patched (by us or by hand)
+    transform: Callable[[str], str]
+    revert: Callable[[str], str]
+    reverted: Callable[[str], bool]  # nothing of ours is left
+
+
+@dataclass(frozen=True)
+class PatchResult:
+    patch: str
+    file: str
+    status: str  # see STATUS_TEXT
+    cached: bool = False
+    detail: str = ""
+
+
+STATUS_TEXT = {
+    "applied": "applied",
+    "already": "already applied",
+    "not_applicable": "target not found",
+    "reverted": "reverted",
+    "not_applied": "nothing to revert",
+    "would_apply": "would be applied",
+    "would_revert": "would be reverted",
+    "missing": "file not found",
+    "failed": "failed",
+}
+
+
+# ── Patches ───────────────────────────────────────
+_BROWSER_OPEN_RE = re.compile(r"^\s*webbrowser\.open\(.*\)$", re.MULTILINE)
+_BROWSER_COMMENTED_RE = re.compile(r"^\s*#\s*webbrowser\.open\(", re.MULTILINE)
+_BROWSER_PATCHED_RE = re.compile(
+    r"^# (\s*webbrowser\.open\(.*\))" + re.escape(PATCH_MARK) + "$", re.MULTILINE
+)
+
+PATCHES = {
+    "disable_browser_auto_launch": Patch(
+        name="disable_browser_auto_launch",
+        file="main.py",
+        description="ComfyUI must not open its own browser tab",
+        needed=lambda text: bool(_BROWSER_OPEN_RE.search(text)),
+        applied=lambda text: bool(_BROWSER_COMMENTED_RE.search(text))
+        and not _BROWSER_OPEN_RE.search(text),
+        transform=lambda text: _BROWSER_OPEN_RE.sub(
+            lambda m: f"# {m.group(0)}{PATCH_MARK}", text
+        ),
+        revert=lambda text: _BROWSER_PATCHED_RE.sub(r"\1", text),
+        reverted=lambda text: not _BROWSER_PATCHED_RE.search(text),
+    ),
+}
+
+
+# ── Engine ────────────────────────────────────────
+def apply_patches(
+    build_path: str, names: list[str] | None = None, dry_run: bool = False
+) -> list[PatchResult]:
+    """
+    Applies the patches (all registered by default) to a build. Each file is
+    read once and written once, atomically, with every patch for it; if its
+    stat signature matches the cached state, it is not read at all.
+    """
+    return _run(build_path, names, dry_run, revert=False)
+
+
+def revert_patches(
+    build_path: str, names: list[str] | None = None, dry_run: bool = False
+) -> list[PatchResult]:
+    """Undoes our patches (hand-made edits without the marker are left alone)."""
+    return _run(build_path, names, dry_run, revert=True)
+
+
+def format_report(results: list[PatchResult]) -> str:
+    """One line per patch, e.g. for a dry run."""
+    lines = []
+    for r in results:
+        text = STATUS_TEXT.get(r.status, r.status)
+        if r.cached:
+            text += " (cached)"
+        if r.detail:
+            text += f" — {r.detail}"
+        lines.append(f"{r.patch} [{r.file}]: {text}")
+    return "\n".join(lines)
+
+
+def get_file_signature(path: str) -> dict | None:
+    """
+    Size, mtime and inode of the file: as long as these are unchanged the
+    contents are taken as unchanged too, so the file need not be read.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino}
+
+
+def _run(build_path, names, dry_run, revert) -> list[PatchResult]:
+    selected = [PATCHES[n] for n in names] if names else list(PATCHES.values())
+    by_file: dict[str, list[Patch]] = {}
+    for patch in selected:
+        by_file.setdefault(patch.file, []).append(patch)
+
+    results = []
+    for rel_path, patches in by_file.items():
+        results.extend(_run_file(build_path, rel_path, patches, dry_run, revert))
+    return results
+
+
+def _state_key(build_path: str, rel_path: str) -> str:
+    return f"patch_state:{os.path.normcase(os.path.abspath(build_path))}:{rel_path}"
+
+
+def _run_file(build_path, rel_path, patches, dry_run, revert) -> list[PatchResult]:
+    path = os.path.join(build_path, rel_path)
+    key = _state_key(build_path, rel_path)
+    signature = get_file_signature(path)
+    if signature is None:
+        return [PatchResult(p.name, rel_path, "missing") for p in patches]
+
+    # Fast path: unchanged since the last check — reuse its verdicts
+    state = StateStore.get(key) or {}
+    cached = state.get("status", {})
+    done = ("not_applied",) if revert else ("already", "not_applicable")
+    up_to_date = all(cached.get(p.name) in done for p in patches)
+    if up_to_date and state.get("stat") == signature:
+        return [PatchResult(p.name, rel_path, cached[p.name], True) for p in patches]
+
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        text = io.StringIO(raw.decode("utf-8"), newline=None).read()
+    except (OSError, UnicodeDecodeError) as e:
+        return [PatchResult(p.name, rel_path, "failed", detail=str(e)) for p in patches]
+
+    digest = _digest(raw)
+    if up_to_date and state.get("hash") == digest:
+        # Only the metadata changed (copied, touched): no need to rescan
+        StateStore.set(key, {**state, "stat": signature})
+        return [PatchResult(p.name, rel_path, cached[p.name], True) for p in patches]
+
+    results = []
+    new_text = text
+    for p in patches:
+        status, new_text = _step(p, new_text, revert)
+        if status == "failed":
+            # one failed patch leaves the whole file untouched
+            return [
+                (
+                    PatchResult(
+                        q.name, rel_path, "failed", detail="verification failed"
+                    )
+                    if q is p
+                    else PatchResult(q.name, rel_path, "failed", detail="skipped")
+                )
+                for q in patches
+            ]
+        if dry_run and status in ("applied", "reverted"):
+            status = "would_apply" if status == "applied" else "would_revert"
+        results.append(PatchResult(p.name, rel_path, status))
+    if dry_run:
+        return results
+
+    if new_text != text:
+        newline = "\r\n" if b"\r\n" in raw else "\n"
+        raw = new_text.replace("\n", newline).encode("utf-8")
+        try:
+            atomic_write(path, raw)
+        except OSError as e:
+            log_event(f"❌ Failed to patch {rel_path}: {e}")
+            return [
+                PatchResult(p.name, rel_path, "failed", detail=str(e)) for p in patches
+            ]
+        signature = get_file_signature(path)
+        digest = _digest(raw)
+
+    # Remember the end state of this file for the next launch
+    after = {"applied": "already", "reverted": "not_applied"}
+    status = dict(cached)
+    for r in results:
+        status[r.patch] = after.get(r.status, r.status)
+    StateStore.set(key, {"stat": signature, "hash": digest, "status": status})
+    return results
+
+
+def _step(patch: Patch, text: str, revert: bool) -> tuple[str, str]:
+    """Runs one patch on the text: (status, new text). Verifies the outcome."""
+    if revert:
+        if patch.reverted(text):
+            return "not_applied", text
+        new_text = patch.revert(text)
+        return ("reverted" if patch.reverted(new_text) else "failed"), new_text
+
+    if patch.applied(text):
+        return "already", text
+    if not patch.needed(text):
+        return "not_applicable", text
+    new_text = patch.transform(text)
+    ok = patch.applied(new_text) and not patch.needed(new_text)
+    return ("applied" if ok else "failed"), new_text
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
@@ -1,25 +1,28 @@
 import subprocess
-from subprocess import TimeoutExpired
-import socket
 import time
 import psutil
 import os
-import shutil
-import re
-import hashlib
 import threading
-from datetime import datetime
-from utils.console_buffer import ConsoleBuffer
-from utils.logger import log_event
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+from utils.comfy_session import ComfySession, SessionRecord
+from utils.console_buffer import ConsoleBuffer, SessionSpill
+from utils.console_stream import ConsolePipeline
+from utils.instances import DEFAULT_INSTANCE, ComfyInstance, InstanceRegistry
+from utils.logger import log_event, phase_ms, timed_event
+from utils.port_listeners import PortListeners
+from utils.state_store import StateStore
+from utils.readiness import is_port_open
+from utils.process_supervisor import StopPolicy
+from utils.cuda_probe import CudaInfo, CudaProbe
+from core.patches import apply_patches, format_report
 from config import (
     COMFYUI_PORT,
-    CHECK_INTERVAL,
     MAX_WAIT_TIME,
-    load_user_config,
-    save_user_config,
+    config_snapshot,
 )
 
-_comfy_process: subprocess.Popen | None = None
+READ_CHUNK_SIZE = 64 * 1024
 
 
 def comfy_exists(path):
@@ -27,123 +30,105 @@ def comfy_exists(path):
     return os.path.exists(os.path.join(path, "main.py"))
 
 
-def is_port_open(port):
-    """Checks if the specified port is open"""
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.settimeout(0.2)
-        return s.connect_ex(("127.0.0.1", port)) == 0
-
-
-def wait_for_server():
+def wait_for_server(instance_id: str = DEFAULT_INSTANCE):
     """Waiting for ComfyUI to load"""
-    start = time.time()
-    while time.time() - start < MAX_WAIT_TIME:
-        if is_port_open(COMFYUI_PORT):
-            log_event("ComfyUI started.")
-            return True
-        time.sleep(CHECK_INTERVAL)
+    if wait_until_ready(instance_id, MAX_WAIT_TIME):
+        log_event("ComfyUI started.")
+        return True
     log_event("Failed to connect to the server.")
     return False
 
 
-def get_listening_pids(port: int) -> set[int]:
-    pids: set[int] = set()
-    try:
-        for c in psutil.net_connections(kind="inet"):
-            if c.laddr and c.laddr.port == port and c.status == psutil.CONN_LISTEN:
-                if c.pid:
-                    pids.add(c.pid)
-    except Exception:
-        pass
-    return pids
+def get_listening_pids(port: int, candidates=()) -> set[int]:
+    """PIDs listening on the port; listeners among `candidates` are preferred"""
+    return PortListeners.find(port, candidates)
 
 
 def is_cuda_available():
-    """Checks for the presence of an NVIDIA GPU via nvidia-smi"""
-    # Checks that nvidia-smi even exists
-    if not shutil.which("nvidia-smi"):
-        return False
-
-    try:
-        result = subprocess.run(
-            ["nvidia-smi"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=5,  # таймаут на случай зависания
-        )
-        return result.returncode == 0
-    except (OSError, TimeoutExpired):
-        return False
+    """Checks for the presence of an NVIDIA GPU via nvidia-smi (cached probe)"""
+    return CudaProbe.get().available
 
 
 # =====================================================================
-# 🔹 Auxiliary functions
+# 🔹 Instances (one ComfyUI server each, keyed by instance id)
 # =====================================================================
+def start_instance(comfy_path: str, build_id: str = "") -> str:
+    """
+    Launches one more ComfyUI next to the running ones, on the next free
+    port; returns its instance id.
+    """
+    instance_id = InstanceRegistry.new_id(taken=SessionRecord.instance_ids())
+    ensure_comfyui_running(comfy_path, instance_id=instance_id, build_id=build_id)
+    return instance_id
 
 
-def get_file_hash(path: str) -> str:
-    """Returns a short MD5 hash of the file for change tracking."""
-    h = hashlib.md5()
-    try:
-        with open(path, "rb") as f:
-            while chunk := f.read(8192):
-                h.update(chunk)
-        return h.hexdigest()
-    except (OSError, IOError):
-        return ""
-
-
-def disable_browser_auto_launch(comfy_path: str):
+def get_instance(instance_id: str = DEFAULT_INSTANCE) -> ComfyInstance:
     """
-    Checks main.py and comments out webbrowser.open(...) if it's not already commented out.
-    Returns (patched: bool, file_hash: str)
+    The instance with this id. The main one always exists (it is registered
+    on first use, not launched); an unknown other id raises KeyError.
     """
-    main_py = os.path.join(comfy_path, "main.py")
-    if not os.path.exists(main_py):
-        log_event("⚠️ main.py not found — skip browser patch.")
-        return False, ""
+    if instance_id == DEFAULT_INSTANCE:
+        return InstanceRegistry.get_or_create(instance_id)
+    instance = InstanceRegistry.get(instance_id)
+    if instance is None:
+        raise KeyError(f"Unknown ComfyUI instance: {instance_id}")
+    return instance
 
-    file_hash = get_file_hash(main_py)
 
-    try:
-        with open(main_py, "r", encoding="utf-8") as f:
-            content = f.read()
-
-        if "# webbrowser.open(" in content:
-            log_event("🧩 Browser auto-launch already disabled.")
-            return True, file_hash
-
-        pattern = re.compile(r"^\s*webbrowser\.open\(.*\)$", re.MULTILINE)
-        if pattern.search(content):
-            patched = pattern.sub(r"# \g<0>  # patched by ComfyLauncher", content)
-            backup = main_py + ".bak"
-            if not os.path.exists(backup):
-                shutil.copy2(main_py, backup)
-            with open(main_py, "w", encoding="utf-8") as f:
-                f.write(patched)
-            log_event("🧩 Browser auto-launch disabled (via patch).")
-            return True, get_file_hash(main_py)
-        else:
-            log_event("ℹ️ No webbrowser.open() found — nothing to patch.")
-            return False, file_hash
-    except Exception as e:
-        log_event(f"❌ Failed to patch browser launch: {e}")
-        return False, file_hash
+def instance_port(instance_id: str = DEFAULT_INSTANCE) -> int:
+    return get_instance(instance_id).port
+
+
+def instance_console(instance_id: str = DEFAULT_INSTANCE) -> type[ConsoleBuffer]:
+    """The console buffer of the instance (same API as ConsoleBuffer)."""
+    return get_instance(instance_id).console
+
+
+def instance_status(instance_id: str = DEFAULT_INSTANCE) -> dict:
+    """{"id", "state", "port", "pid", "build_id", "mode"} of one instance."""
+    instance = get_instance(instance_id)
+    if instance.state in ("starting", "running") and not instance.supervisor.running():
+        instance.state = "stopped"  # exited (or crashed) on its own
+    elif instance.state == "starting" and is_port_open(instance.port):
+        instance.state = "running"
+    return instance.status()
+
+
+def list_instances() -> list[dict]:
+    return [instance_status(i.id) for i in InstanceRegistry.all()]
+
 
+def wait_until_ready(
+    instance_id: str = DEFAULT_INSTANCE,
+    timeout: float | None = MAX_WAIT_TIME,
+    cancelled: Callable[[], bool] = lambda: False,
+) -> bool:
+    """Blocks until the instance answers (see ServerReadiness.wait)."""
+    instance = get_instance(instance_id)
+    ready = instance.readiness.wait(instance.port, timeout, cancelled=cancelled)
+    if ready and instance.state == "starting":
+        instance.state = "running"
+    return ready
 
-def update_browser_patch_registry(comfy_path: str, patched: bool, file_hash: str):
-    """Saves the patch state in user_config.json."""
-    cfg = load_user_config()
-    registry = cfg.get("browser_patch_registry", {})
 
-    registry[comfy_path] = {
-        "patched": patched,
-        "file_hash": file_hash,
-        "timestamp": datetime.now().isoformat(timespec="seconds"),
-    }
+def keep_instances_after_exit():
+    """The launcher exits but its servers stay up (their jobs must not kill them)."""
+    for instance in InstanceRegistry.all():
+        instance.supervisor.keep_after_exit()
 
-    cfg["browser_patch_registry"] = registry
-    save_user_config(cfg)
+
+def stop_all_instances(policy: StopPolicy | None = None):
+    """Stops every instance: running ones and those recorded by a previous launcher."""
+    ids = {i.id for i in InstanceRegistry.all() if i.state != "stopped"}
+    ids.update(SessionRecord.instance_ids())
+    ids.add(DEFAULT_INSTANCE)
+    for instance_id in sorted(ids, key=lambda i: i == DEFAULT_INSTANCE):
+        stop_comfyui_hard(policy=policy, instance_id=instance_id)
+
+
+# =====================================================================
+# 🔹 Auxiliary functions
+# =====================================================================
 
 
 def resolve_python_exe(base_dir: str) -> str:
@@ -161,92 +146,103 @@ def resolve_python_exe(base_dir: str) -> str:
     return "python"
 
 
-def ensure_comfyui_running(comfy_path: str, port: int = 8188):
+def ensure_comfyui_running(
+    comfy_path: str,
+    port: int | None = None,
+    instance_id: str = DEFAULT_INSTANCE,
+    build_id: str | None = None,
+) -> ComfyInstance:
     """
     1) Checks if the server is running.
-    2) Checks if main.py is patched (auto-browser is disabled).
-    3) If necessary, patches and updates user_config.json.
+    2) Checks if the build is patched (auto-browser is disabled) and patches it.
+    3) Probes CUDA and picks the bat / Python mode.
     4) Launches ComfyUI (via bat or directly).
+    Steps 1-3 run concurrently. The whole launch is recorded as one
+    "comfy.launch" structured event, with per-stage timings in "phases".
+    The main instance runs the last used build on COMFYUI_PORT; any other
+    gets the next free port unless `port` is given.
     """
-    global _comfy_process
-
-    # --- Browser Check and Patch -------------------------------------
-    main_py = os.path.join(comfy_path, "main.py")
-    file_hash = get_file_hash(main_py)
-
-    cfg = load_user_config()
+    if build_id is None:
+        build_id = str(StateStore.get("last_used_build_id", "") or "")
+    instance = InstanceRegistry.get_or_create(instance_id, port, build_id)
+    with timed_event(
+        "comfy.launch", port=instance.port, instance=instance_id, phases={}
+    ) as ev:
+        _ensure_comfyui_running(comfy_path, instance, ev)
+    return instance
+
+
+def _ensure_comfyui_running(comfy_path: str, instance: ComfyInstance, ev: dict):
+    phases = ev["phases"]
+    port = instance.port
+
+    # --- Config ------------------------------------------------------
+    cfg = config_snapshot()
+    ev["build_id"] = instance.build_id
     show_cmd = cfg.get("show_cmd", True)
     use_internal_console = not show_cmd
+    if use_internal_console:
+        instance.console.configure(
+            max_bytes=int(cfg.get("console_memory_mb", 8) or 8) * 1024 * 1024,
+            spill=bool(cfg.get("console_spill_to_disk", True)),
+        )
+    active_build = _get_build(cfg, instance.build_id)
+    startup_mode = str((active_build or {}).get("startup_mode", "auto"))
 
-    registry = cfg.get("browser_patch_registry", {})
-    entry = registry.get(comfy_path, {})
-
-    need_patch = (
-        not entry
-        or entry.get("file_hash") != file_hash
-        or not entry.get("patched", False)
-    )
+    # --- Pre-launch probes, run side by side ---------------------------
+    # Launch waits for the slowest of them, not for their sum.
+    t_pre = time.monotonic()
+    patches = _stage(_patch_build, comfy_path)
+    port_probe = _stage(is_port_open, port)
+    cuda_probe = _stage(_probe_cuda)
+    plan = _stage(_plan_launch, comfy_path, startup_mode, cuda_probe)
 
-    if need_patch:
-        patched, new_hash = disable_browser_auto_launch(comfy_path)
-        update_browser_patch_registry(comfy_path, patched, new_hash)
-    else:
-        log_event("✅ Browser patch check skipped — already up to date.")
+    ev["patches"] = _join(patches, phases, "patch_ms")
 
     # Is there a live process already?
-    if _comfy_process and _comfy_process.poll() is None:
+    if instance.process and instance.process.poll() is None:
         log_event("⚠️ ComfyUI process is already running, skip start.")
+        ev["outcome"] = "already_running"
+        return
+
+    # Left running by a previous launcher? Take it over
+    session = reattach_session(instance.id)
+    if session is not None:
+        ev.update(outcome="reattached", comfy_pid=session.pid)
         return
 
     # Port busy - Comfy is already running
-    if is_port_open(port):
+    if _join(port_probe, phases, "port_probe_ms"):
         log_event("✅ ComfyUI already launched.")
+        ev["outcome"] = "port_busy"
         return
 
     # --- GPU / CPU select ---------------------------------------------
-    try:
-        cuda_available = is_cuda_available()
-    except Exception:
-        cuda_available = False
-
-    cfg = load_user_config()
-    active_build = _get_active_build(cfg)
-    startup_mode = (active_build or {}).get("startup_mode", "auto")
-
-    bat_name, mode = _resolve_bat_name(str(startup_mode), cuda_available)
-    log_event(f"🚀 Starting ComfyUI in {mode} mode...")
-
+    cuda = _join(cuda_probe, phases, "cuda_probe_ms")
+    cuda_available = cuda.available
+    ev["cuda_source"] = cuda.source
+    ev["gpus"] = [f"{d.name} ({d.memory_mb} MB)" for d in cuda.devices]
+
+    bat_file, bat_name, mode, notes = _join(plan, phases, "plan_ms")
+    for note in notes:
+        log_event(note)  # logged only now that a spawn is certain
     base_dir = os.path.dirname(comfy_path)
-    bat_file = os.path.join(base_dir, bat_name)
-
-    # --- BAT mode ----------------------------------------------------
-    sm = str(startup_mode).lower()
-
-    # downgrade chain for missing bats
-    if not os.path.exists(bat_file):
-        if sm == "cpu":
-            log_event("⚠️ run_cpu.bat not found → fallback to Python mode")
-        elif sm == "fast_fp16":
-            log_event(f"⚠️ Selected bat not found: {bat_name} → fallback to GPU bat")
-            bat_name, mode = "run_nvidia_gpu.bat", "GPU"
-            bat_file = os.path.join(base_dir, bat_name)
-
-            if not os.path.exists(bat_file):
-                log_event("⚠️ GPU bat not found either → fallback to AUTO")
-                bat_name, mode = _resolve_bat_name("auto", cuda_available)
-                bat_file = os.path.join(base_dir, bat_name)
-
-        elif sm == "gpu":
-            log_event(f"⚠️ Selected bat not found: {bat_name} → fallback to AUTO")
-            bat_name, mode = _resolve_bat_name("auto", cuda_available)
-            bat_file = os.path.join(base_dir, bat_name)
+    phases["prelaunch_ms"] = phase_ms(t_pre)
+    if bat_file and port != COMFYUI_PORT:
+        # the bats start ComfyUI on its default port; only Python mode takes
+        # --port. The bat's own flags are carried over (see _BAT_FLAGS).
+        log_event(
+            f"⚠️ Port {port} is not the default → Python mode instead of {bat_name}"
+        )
+        bat_file = None
 
-    if os.path.exists(bat_file):
+    if bat_file:
         log_event(f"🚀 Starting ComfyUI via {bat_name} ({mode})")
     else:
         log_event(f"🚀 Starting ComfyUI in Python mode ({mode})")
 
-    if os.path.exists(bat_file):
+    t0 = time.monotonic()
+    if bat_file:
 
         env = os.environ.copy()
         env["PYTHONUNBUFFERED"] = "1"
@@ -254,7 +250,7 @@ def ensure_comfyui_running(comfy_path: str, port: int = 8188):
 
         if show_cmd:
             # 🔹 MODE: SHOW CMD (REAL)
-            _comfy_process = subprocess.Popen(
+            proc = subprocess.Popen(
                 ["cmd.exe", "/k", bat_file],
                 cwd=base_dir,
                 creationflags=subprocess.CREATE_NEW_CONSOLE,
@@ -262,15 +258,14 @@ def ensure_comfyui_running(comfy_path: str, port: int = 8188):
 
         else:
             # 🔹 MODE: HIDDEN CONSOLE (PIPE)
-            _comfy_process = subprocess.Popen(
+            proc = subprocess.Popen(
                 ["cmd.exe", "/d", "/c", bat_file],  # бат выполняем через cmd корректно
                 cwd=base_dir,
                 env=env,
                 creationflags=subprocess.CREATE_NO_WINDOW,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,  # один поток → без зависаний/пачек
-                text=True,
-                bufsize=1,
+                bufsize=0,  # raw pipe — read in chunks by _read_process_output
             )
 
     # --- Python mode -------------------------------------------------
@@ -283,8 +278,12 @@ def ensure_comfyui_running(comfy_path: str, port: int = 8188):
             os.path.join(comfy_path, "main.py"),
             "--windows-standalone-build",
         ]
-        if not cuda_available:
+        if not cuda_available or mode == "CPU":
             args.append("--cpu")
+        else:
+            args += _BAT_FLAGS.get(mode, [])
+        if port != COMFYUI_PORT:
+            args += ["--port", str(port)]
 
         env = os.environ.copy()
         env["PYTHONUNBUFFERED"] = "1"
@@ -294,153 +293,450 @@ def ensure_comfyui_running(comfy_path: str, port: int = 8188):
         env["PYTHONIOENCODING"] = "utf-8"
 
         if show_cmd:
-            _comfy_process = subprocess.Popen(
+            proc = subprocess.Popen(
                 ["cmd.exe", "/k"] + args,
                 cwd=comfy_path,
                 env=env,
                 creationflags=subprocess.CREATE_NEW_CONSOLE,
             )
         else:
-            _comfy_process = subprocess.Popen(
+            proc = subprocess.Popen(
                 args,
                 cwd=comfy_path,
                 env=env,
                 creationflags=subprocess.CREATE_NO_WINDOW,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
+                bufsize=0,
             )
 
+    instance.process = proc
+    instance.comfy_path = comfy_path
+    instance.mode = mode
+    instance.state = "starting"
+    instance.supervisor.track(proc)
+    _record_session(
+        instance, base_dir if bat_file else comfy_path, use_internal_console
+    )
+
     # We read the output ONLY in the built-in console mode
-    if use_internal_console and _comfy_process:
+    readiness = instance.readiness.begin(captured=use_internal_console)
+    if use_internal_console:
         threading.Thread(
-            target=_read_process_output, args=(_comfy_process,), daemon=True
+            target=_read_process_output,
+            args=(instance, proc, readiness),
+            daemon=True,
         ).start()
 
-    log_event(f"🟢 ComfyUI started (PID {_comfy_process.pid}) in mode {mode}.")
+    phases["spawn_ms"] = phase_ms(t0)
+    ev.update(outcome="started", comfy_pid=proc.pid, mode=mode)
+    log_event(
+        f"🟢 ComfyUI started (PID {proc.pid}) in mode {mode}"
+        + (f" — instance {instance.id}, port {port}." if port != COMFYUI_PORT else ".")
+    )
+
+
+# =====================================================================
+# 🔹 Session record (reattach after a launcher restart)
+# =====================================================================
+def _record_session(instance: ComfyInstance, cwd: str, captured: bool):
+    proc = instance.process
+    try:
+        create_time = psutil.Process(proc.pid).create_time()
+    except psutil.Error:
+        return  # already gone — nothing to come back to
+    args = proc.args if isinstance(proc.args, list) else [str(proc.args)]
+    SessionRecord.save(
+        ComfySession(
+            pid=proc.pid,
+            create_time=create_time,
+            port=instance.port,
+            instance_id=instance.id,
+            build_id=str(instance.build_id or ""),
+            mode=instance.mode,
+            args=[str(a) for a in args],
+            cwd=cwd,
+            log_path=instance.console.spill_path() if captured else None,
+            captured=captured,
+            members=instance.supervisor.members(),
+            job=instance.supervisor.job_name,
+        )
+    )
+
+
+def reattach_session(instance_id: str = DEFAULT_INSTANCE) -> ComfySession | None:
+    """
+    Takes over the ComfyUI recorded by a previous launcher, if it is still
+    the very same process tree (PID + create time). A stale record is
+    dropped. Returns the session, or None when there is nothing to attach to.
+    """
+    instance = InstanceRegistry.get(instance_id)
+    if instance is not None and instance.supervisor.tracking:
+        return None
+    session = SessionRecord.load(instance_id)
+    if session is None:
+        return None
+    if instance is None:
+        instance = InstanceRegistry.get_or_create(
+            instance_id, session.port, session.build_id
+        )
+    members = session.members or [[session.pid, session.create_time]]
+    if not instance.supervisor.attach(members, job_name=session.job):
+        log_event(f"ℹ️ Recorded ComfyUI (PID {session.pid}) is gone — record dropped.")
+        SessionRecord.clear(instance_id)
+        if instance_id != DEFAULT_INSTANCE:
+            InstanceRegistry.remove(instance_id)
+        return None
+
+    # Its console belongs to the old launcher: readiness comes from the port
+    instance.port = session.port
+    instance.build_id = session.build_id
+    instance.mode = session.mode
+    instance.state = "running" if is_port_open(session.port) else "starting"
+    instance.readiness.begin(captured=False)
+    SessionRecord.update_members(instance_id, instance.supervisor.members())
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session.started_at))
+    log_event(
+        f"🔗 Reattached to ComfyUI (PID {session.pid}, port {session.port}, "
+        f"build {session.build_id or '?'}, started {started})."
+    )
+    if session.log_path:
+        SessionSpill.pin(session.log_path)  # its history must survive our pruning
+        log_event(f"📄 Its console output so far: {session.log_path}")
+    return session
+
+
+# =====================================================================
+# 🔹 Pre-launch stages
+# =====================================================================
+_prelaunch_pool: ThreadPoolExecutor | None = None
+_prelaunch_lock = threading.Lock()
+
+
+def _stage(fn, *args) -> Future:
+    """Starts one pre-launch step on the shared pool; the result carries its duration."""
+    global _prelaunch_pool
+    with _prelaunch_lock:
+        if _prelaunch_pool is None:
+            _prelaunch_pool = ThreadPoolExecutor(
+                max_workers=4, thread_name_prefix="comfy-prelaunch"
+            )
+
+    def run():
+        t0 = time.monotonic()
+        result = fn(*args)
+        return result, phase_ms(t0)
+
+    return _prelaunch_pool.submit(run)
+
+
+def _join(future: Future, phases: dict, name: str):
+    """Waits for a stage and records how long it ran as phases[name]."""
+    result, duration = future.result()
+    phases[name] = duration
+    return result
+
 
+def _patch_build(comfy_path: str) -> dict:
+    # One stat per patched file when nothing changed since the last launch
+    results = apply_patches(comfy_path)
+    for r in results:
+        if r.status == "applied":
+            log_event(f"🧩 Patch applied: {r.patch}")
+        elif r.status in ("failed", "missing"):
+            log_event(f"⚠️ Patch check: {format_report([r])}")
+    if all(r.cached for r in results):
+        log_event("✅ Build patch check skipped — already up to date.")
+    return {r.patch: r.status for r in results}
 
-def kill_process_tree(pid):
-    """Kills the process and all its descendants"""
+
+def _probe_cuda() -> CudaInfo:
+    try:
+        return CudaProbe.get()
+    except Exception:
+        return CudaInfo(False, source="error")
+
+
+def _plan_launch(
+    comfy_path: str, startup_mode: str, cuda_probe: Future
+) -> tuple[str | None, str, str, list[str]]:
+    """
+    Picks the bat (or Python mode) to start: (bat_file or None, bat_name,
+    mode, notes). The fallback notes are returned, not logged — the caller
+    logs them only if it goes on to spawn. Only the final choice needs the
+    CUDA answer; it is awaited last.
+    """
+    base_dir = os.path.dirname(comfy_path)
+    sm = startup_mode.lower()
+    if sm in ("cpu", "gpu", "fast_fp16"):
+        bat_name, mode = _resolve_bat_name(startup_mode, False)
+    else:
+        bat_name, mode = _resolve_bat_name(
+            startup_mode, cuda_probe.result()[0].available
+        )
+    bat_file = os.path.join(base_dir, bat_name)
+    notes: list[str] = []
+
+    # --- BAT mode ----------------------------------------------------
+    # downgrade chain for missing bats
+    if not os.path.exists(bat_file):
+        if sm == "cpu":
+            notes.append("⚠️ run_cpu.bat not found → fallback to Python mode")
+        elif sm == "fast_fp16":
+            notes.append(f"⚠️ Selected bat not found: {bat_name} → fallback to GPU bat")
+            bat_name, mode = "run_nvidia_gpu.bat", "GPU"
+            bat_file = os.path.join(base_dir, bat_name)
+
+            if not os.path.exists(bat_file):
+                notes.append("⚠️ GPU bat not found either → fallback to AUTO")
+                cuda_available = cuda_probe.result()[0].available
+                bat_name, mode = _resolve_bat_name("auto", cuda_available)
+                bat_file = os.path.join(base_dir, bat_name)
+
+        elif sm == "gpu":
+            notes.append(f"⚠️ Selected bat not found: {bat_name} → fallback to AUTO")
+            cuda_available = cuda_probe.result()[0].available
+            bat_name, mode = _resolve_bat_name("auto", cuda_available)
+            bat_file = os.path.join(base_dir, bat_name)
+
+    if os.path.exists(bat_file):
+        return bat_file, bat_name, mode, notes
+    return None, bat_name, mode, notes
+
+
+def kill_process_tree(pid, timeout: float = 3.0):
+    """Terminates the process and all its descendants; kills what outlives `timeout`"""
     try:
         parent = psutil.Process(pid)
+        tree = parent.children(recursive=True) + [parent]
     except psutil.NoSuchProcess:
         return
 
-    for child in parent.children(recursive=True):
+    for proc in tree:
         try:
-            log_event(f"💀 Killing child PID {child.pid}: {child.name()}")
-            child.kill()
+            log_event(f"⏹ Terminating PID {proc.pid}: {proc.name()}")
+            proc.terminate()
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             pass
 
-    log_event(f"💀 Killing parent PID {pid}: {parent.name()}")
-    try:
-        parent.kill()
-    except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-        pass
-
-
-def stop_comfyui_hard(_grace_period=5):
-    """Completely completes ComfyUI (bat file + python descendants)."""
-    global _comfy_process
-    log_event("⏹ Completing ComfyUI...")
+    _, alive = psutil.wait_procs(tree, timeout=timeout)
+    for proc in alive:
+        try:
+            log_event(f"💀 Killing PID {proc.pid}: {proc.name()}")
+            proc.kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            pass
 
-    killed = False
 
-    # 1️⃣ Let's try to kill the running .bat
-    for proc in psutil.process_iter(["pid", "name", "cmdline"]):
-        try:
-            # safely get the command line
-            cmdline = proc.info.get("cmdline") or []
-            if not cmdline:
-                continue
-            cmdline_joined = " ".join(cmdline).lower()
+def stop_policy(restart: bool = False) -> StopPolicy:
+    """The stop policy from user settings (a restart may let the running prompt finish)."""
+    cfg = config_snapshot()
+    drain = restart and bool(cfg.get("restart_finish_job", False))
+    return StopPolicy(
+        mode="drain" if drain else "interrupt",
+        drain_timeout=float(cfg.get("restart_drain_timeout", 120)),
+        terminate_timeout=float(cfg.get("stop_terminate_timeout", 5)),
+    )
 
-            if (
-                "run_cpu.bat" in cmdline_joined
-                or "run_nvidia_gpu.bat" in cmdline_joined
-                or "run_nvidia_gpu_fast_fp16.bat" in cmdline_joined
-            ):
-                log_event(
-                    f"💀 We are finishing the bat file and all its descendants (PID {proc.pid})"
-                )
-                time.sleep(1)
-                kill_process_tree(proc.pid)
-                # To be on the safe side, we'll additionally check for descendants after kill.
-                time.sleep(0.5)
-                for child in psutil.process_iter(["pid", "ppid", "name"]):
-                    if child.info["ppid"] == proc.pid:
-                        log_event(
-                            f"⚠️ Descendant {child.pid} ({child.info['name']}) still alive - kill directly"
-                        )
-                        child.kill()
-                killed = True
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
 
-    # 2️⃣ If the batch file is not found, fallback: look for python main.py
-    if not killed:
-        for proc in psutil.process_iter(["pid", "name", "cmdline"]):
-            try:
-                cmd = " ".join(proc.info["cmdline"]).lower()
-                if "comfyui" in cmd or "main.py" in cmd:
-                    log_event(f"💀 Force quit ComfyUI (PID {proc.pid})")
-                    proc.kill()
-                    killed = True
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
+def stop_comfyui_hard(
+    _grace_period=5,
+    policy: StopPolicy | None = None,
+    instance_id: str = DEFAULT_INSTANCE,
+):
+    """
+    Completely completes ComfyUI (bat file + python descendants): queue
+    interrupt/drain over HTTP, terminate, wait, then kill — per `policy`.
+    Only the given instance is stopped.
+    """
+    instance = InstanceRegistry.get(instance_id)
+    if instance is None or not instance.supervisor.tracking:
+        reattach_session(instance_id)  # a server we left running last time
+    try:
+        instance = get_instance(instance_id)
+    except KeyError:
+        return  # its recorded server is already gone
+    with timed_event(
+        "comfy.stop",
+        port=instance.port,
+        instance=instance_id,
+        build_id=instance.build_id,
+    ) as ev:
+        _stop_comfyui_hard(_grace_period, policy or stop_policy(), instance, ev)
+
+
+def _stop_comfyui_hard(
+    _grace_period: float, policy: StopPolicy, instance: ComfyInstance, ev: dict
+):
+    port = instance.port
+    supervisor = instance.supervisor
+    log_event(
+        "⏹ Completing ComfyUI..."
+        if instance.id == DEFAULT_INSTANCE
+        else f"⏹ Completing ComfyUI instance {instance.id} (port {port})..."
+    )
+    instance.state = "stopping"
+    if supervisor.pid is not None:
+        ev["comfy_pid"] = supervisor.pid
+    supervisor.refresh()  # collect the descendants once, now
+    tree = [pid for pid, _ in supervisor.members()]  # likely port owners
+
+    # 1️⃣ The tree we launched ourselves: exactly those processes, nothing else
+    if supervisor.tracking:
+        ev["method"] = "supervisor"
+        ev["policy"] = policy.mode
+        result = supervisor.stop(policy, port=port)
+        killed = result["found"] > 0
+        ev.update(
+            stopped=result["found"],
+            forced=result["forced"],
+            queue=result.get("queue"),
+            stages=result["stages"],
+        )
+        stages = ", ".join(f"{k} {v}" for k, v in result["stages"].items())
+        log_event(f"⏱ Stop stages: {stages or 'none'}")
+        if result["survivors"]:
+            log_event(f"⚠️ Processes still alive after kill: {result['survivors']}")
+    # 2️⃣ Not launched by this session: last-resort scan of all processes,
+    # sparing the trees of the other instances
+    elif instance.id == DEFAULT_INSTANCE:
+        ev["method"] = "scan"
+        others = {
+            pid
+            for other in InstanceRegistry.all()
+            if other is not instance
+            for pid, _ in other.supervisor.members()
+        }
+        killed = _kill_comfy_by_scan(_grace_period, exclude=others)
+    else:
+        ev["method"] = "port"
+        killed = False
 
     if killed:
-        # 3️⃣ Confirm state
-        if not is_port_open(COMFYUI_PORT):
-            log_event("🟢 Port 8188 closed — server fully stopped.")
-        else:
-            log_event("⚠️ Port still busy — possible residual process.")
         log_event("✅ ComfyUI stopped completely.")
     else:
         log_event("⚠️ No ComfyUI process found to stop.")
 
+    # 3️⃣ Confirm state: whatever still listens on the port goes too
     deadline = time.time() + _grace_period
-    while time.time() < deadline and is_port_open(COMFYUI_PORT):
-        pids = get_listening_pids(COMFYUI_PORT)
+    while time.time() < deadline and is_port_open(port):
+        pids = get_listening_pids(port, tree)
         if not pids:
             time.sleep(0.2)
             continue
 
         for pid in pids:
-            log_event(f"💀 Killing listener on port {COMFYUI_PORT}: PID {pid}")
+            log_event(f"💀 Killing listener on port {port}: PID {pid}")
             kill_process_tree(pid)
 
         time.sleep(0.3)
 
-    if not is_port_open(COMFYUI_PORT):
-        log_event("🟢 Port 8188 closed — server fully stopped.")
+    if not is_port_open(port):
+        log_event(f"🟢 Port {port} closed — server fully stopped.")
+        ev["outcome"] = "stopped" if killed else "not_found"
     else:
         log_event("⚠️ Port still busy — residual process remains.")
+        ev["outcome"] = "port_busy"
+
+    instance.process = None
+    instance.state = "stopped"
+    SessionRecord.clear(instance.id)
+    if instance.id != DEFAULT_INSTANCE:
+        InstanceRegistry.remove(instance.id)  # its port is free for the next one
+
+
+def _kill_comfy_by_scan(timeout: float, exclude: set[int] = frozenset()) -> bool:
+    """
+    Recovery path for a ComfyUI this session did not start (e.g. left behind
+    by a previous launcher): finds it by command line across all processes.
+    PIDs in `exclude` (other running instances) are never touched.
+    """
+    victims = []
+    bats = ("run_cpu.bat", "run_nvidia_gpu.bat", "run_nvidia_gpu_fast_fp16.bat")
+
+    # Let's try to kill the running .bat (and its descendants)
+    for proc in psutil.process_iter(["pid", "name", "cmdline"]):
+        if proc.pid in exclude:
+            continue
+        try:
+            cmdline = " ".join(proc.info.get("cmdline") or []).lower()
+            if any(bat in cmdline for bat in bats):
+                log_event(
+                    f"💀 We are finishing the bat file and all its descendants (PID {proc.pid})"
+                )
+                victims.extend(
+                    c for c in proc.children(recursive=True) if c.pid not in exclude
+                )
+                victims.append(proc)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
 
-    _comfy_process = None
+    # If the batch file is not found, fallback: look for python main.py
+    if not victims:
+        for proc in psutil.process_iter(["pid", "name", "cmdline"]):
+            if proc.pid in exclude:
+                continue
+            try:
+                cmd = " ".join(proc.info.get("cmdline") or []).lower()
+                if "comfyui" in cmd or "main.py" in cmd:
+                    log_event(f"💀 Force quit ComfyUI (PID {proc.pid})")
+                    victims.append(proc)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
 
+    for proc in victims:
+        try:
+            proc.kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    psutil.wait_procs(victims, timeout=timeout)
+    return bool(victims)
 
-def _read_process_output(proc: subprocess.Popen):
-    """Reads stdout of ComfyUI process and writes to ConsoleBuffer."""
+
+def _read_process_output(
+    instance: ComfyInstance, proc: subprocess.Popen, readiness: int
+):
+    """
+    Reads stdout of ComfyUI process and writes to the instance's console
+    buffer. The raw pipe is read in large chunks; splitting, decoding and
+    carriage-return collapsing happen in bulk per chunk, and progress-bar
+    rewrites update the buffer's live line in place.
+    """
+    if not proc.stdout:
+        instance.readiness.stream_closed(readiness)
+        return
+
+    # the readiness detector watches the same lines for the "server up" marker
+    pipeline = ConsolePipeline(
+        on_lines=lambda lines: instance.readiness.feed(readiness, lines),
+        buffer=instance.console,
+    )
+    fd = proc.stdout.fileno()
     try:
-        if proc.stdout:
-            for line in proc.stdout:
-                ConsoleBuffer.add(line)
+        while True:
+            chunk = os.read(fd, READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            pipeline.feed(chunk)
     except Exception as e:
-        ConsoleBuffer.add(f"[Console reader error] {e}\n")
+        instance.console.add(f"[Console reader error] {e}\n")
+    finally:
+        pipeline.close()
+        instance.readiness.stream_closed(readiness)
 
 
-def _get_active_build(cfg: dict) -> dict | None:
-    bid = str(cfg.get("last_used_build_id", "")).strip()
+def _get_build(cfg, build_id: str) -> dict | None:
+    bid = str(build_id or "").strip()
     for b in cfg.get("builds", []) or []:
         if str(b.get("id", "")) == bid:
             return b
     return None
 
 
+# ComfyUI flags a GPU bat passes to main.py, for when Python mode replaces it
+_BAT_FLAGS = {"GPU (fast fp16)": ["--fast", "fp16_accumulation"]}
+
+
 def _resolve_bat_name(startup_mode: str, cuda_available: bool) -> tuple[str, str]:
     """
     Returns (bat_name, mode_label)
@@ -465,4 +761,11 @@ __all__ = [
     "stop_comfyui_hard",
     "comfy_exists",
     "kill_process_tree",
+    "reattach_session",
+    "start_instance",
+    "stop_all_instances",
+    "keep_instances_after_exit",
+    "instance_status",
+    "list_instances",
+    "wait_until_ready",
 ]
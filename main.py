@@ -12,10 +12,31 @@ from ui.dialogs.setup_window import SetupWindow
 from ui.dialogs.build_manager_dialog import BuildManagerDialog
 from ui.theme.manager import THEME
 from launcher import comfy_exists
-from config import get_comfyui_path, ICON_PATH, load_user_config, save_user_config
+from config import (
+    get_comfyui_path,
+    ICON_PATH,
+    config_snapshot,
+    update_config,
+)
+from utils.cuda_probe import CudaProbe
+from utils.logger import configure_rotation, install_excepthook
+from utils.state_store import StateStore
+
+
+def _configure_logging():
+    cfg = config_snapshot()
+    configure_rotation(
+        max_bytes=int(float(cfg.get("log_max_mb", 5) or 0) * 1024 * 1024),
+        max_age_days=cfg.get("log_max_age_days", 30) or 0,
+        keep=cfg.get("log_keep_files", 5),
+        compress=cfg.get("log_compress", True),
+    )
 
 
 def launch_app():
+    install_excepthook()
+    _configure_logging()
+    CudaProbe.prefetch()  # answered by the time ComfyUI is launched
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon(ICON_PATH))
     THEME.apply()
@@ -49,7 +70,7 @@ def launch_app():
             sys.exit(0)
 
     # ── BUILD MANAGER (ВСЕГДА) ─────────────────────────────
-    data = load_user_config()
+    data = config_snapshot()
     builds = data.get("builds", []) or []
 
     # если по какой-то причине builds пустой — уходим в setup
@@ -58,7 +79,7 @@ def launch_app():
         result = setup.exec()
         if result != QDialog.DialogCode.Accepted:
             sys.exit(0)
-        data = load_user_config()
+        data = config_snapshot()
         builds = data.get("builds", []) or []
         if not builds:
             sys.exit(0)
@@ -68,23 +89,19 @@ def launch_app():
     if result != QDialog.DialogCode.Accepted or not mgr.selected_build_id:
         sys.exit(0)
 
-    # перечитываем конфиг — пользователь мог добавить новый билд внутри менеджера
-    data = load_user_config()
-    builds = data.get("builds", []) or []
-
-    # применяем выбор -> записываем comfyui_path и last_used_build_id
-    selected = None
-    for b in builds:
-        if b.get("id") == mgr.selected_build_id:
-            selected = b
-            break
+    # применяем выбор к свежему конфигу — пользователь мог добавить новый билд
+    # внутри менеджера -> записываем comfyui_path и last_used_build_id
+    def select_build(data: dict):
+        for b in data.get("builds", []) or []:
+            if b.get("id") == mgr.selected_build_id:
+                data["comfyui_path"] = b["path"]
+                return b
+        return None
 
+    selected = update_config(select_build)
     if not selected:
         sys.exit(0)
-
-    data["last_used_build_id"] = selected["id"]
-    data["comfyui_path"] = selected["path"]
-    save_user_config(data)
+    StateStore.set("last_used_build_id", selected["id"])
 
     # ─── MAIN UI (ВСЕГДА) ────────────────────────────────────
     win = ComfyBrowser()
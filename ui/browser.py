@@ -5,7 +5,6 @@ from PyQt6.QtCore import Qt, QTimer, QRectF, QThread
 import threading
 import webbrowser
 import os
-import time
 from datetime import datetime
 
 from ui.header import HeaderBar
@@ -18,18 +17,28 @@ from core.errors import ERRORS
 from version import __version__
 from ui.splash_video import LauncherSplashVideo
 from ui.webview2_widget import WebView2Widget
-from utils.logger import log_event
+from utils.logger import log_event, timed_event
+from utils.console_feed import ConsoleFeed
+from utils.cuda_probe import CudaProbe
+from utils.instances import DEFAULT_INSTANCE
+from utils.readiness import wait_port_closed
+from utils.state_store import StateStore
 from utils.update_checker import UpdateService
 from launcher import (
     ensure_comfyui_running,
+    instance_console,
+    instance_port,
+    keep_instances_after_exit,
+    stop_all_instances,
     stop_comfyui_hard,
+    stop_policy,
     is_port_open,
+    wait_until_ready,
 )
 from config import (
     get_comfyui_path,
-    COMFYUI_PORT,
-    load_user_config,
-    save_user_config,
+    config_snapshot,
+    flush_user_config,
     SPLASH_PATH,
 )
 
@@ -54,6 +63,8 @@ class ComfyBrowser(QMainWindow):
         self.error_widget = None
         self.setWindowTitle("ComfyLauncher")
         self.comfyui_path = get_comfyui_path()
+        self.instance_id = DEFAULT_INSTANCE  # the server this window shows
+        self.port = instance_port(self.instance_id)
         self.settings_window = None
 
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint)
@@ -98,6 +109,15 @@ class ComfyBrowser(QMainWindow):
         self.header.settings_clicked.connect(self.open_settings)
         self.header.output_clicked.connect(self.open_output)
 
+        # ── Live progress from the internal console ─────────
+        self.progress_feed = None
+        if self.header.use_internal_console:
+            console = instance_console(self.instance_id)
+            self.progress_feed = ConsoleFeed(
+                self, from_seq=console.last_seq(), buffer=console
+            )
+            self.progress_feed.progress_changed.connect(self.header.set_progress)
+
         self.ui_state = "STARTING_COMFY"
         self._start_comfyui()
 
@@ -110,6 +130,7 @@ class ComfyBrowser(QMainWindow):
 
         self._restart_in_progress = True
         log_event("🔄 Restarting ComfyUI...")
+        CudaProbe.invalidate(negative_only=True)  # a retry re-checks a missing GPU
 
         # We block the Restart button so that it cannot be pressed again.
         try:
@@ -122,36 +143,38 @@ class ComfyBrowser(QMainWindow):
         self.status_label.setStyleSheet("color: orange; font-weight: bold;")
 
         def do_restart():
-            # If the server is running, we soft-stop it.
-            if is_port_open(COMFYUI_PORT):
-                log_event("🟢 Server detected — performing soft stop.")
-                stop_comfyui_hard()
-            else:
-                log_event("🔴 Server not running — starting fresh.")
-
-            # We wait until the port is definitely free (up to 5 seconds)
-            log_event("⏳ Waiting for port to close...")
-            for i in range(10):
-                if not is_port_open(COMFYUI_PORT):
+            with timed_event("comfy.restart", port=self.port) as ev:
+                # If the server is running, we soft-stop it.
+                ev["was_running"] = is_port_open(self.port)
+                if ev["was_running"]:
+                    log_event("🟢 Server detected — performing soft stop.")
+                    stop_comfyui_hard(
+                        policy=stop_policy(restart=True), instance_id=self.instance_id
+                    )
+                else:
+                    log_event("🔴 Server not running — starting fresh.")
+
+                # We wait until the port is definitely free (up to 5 seconds)
+                log_event("⏳ Waiting for port to close...")
+                if wait_port_closed(self.port, timeout=5):
                     log_event("🟢 Port closed, continuing restart.")
-                    break
-                time.sleep(0.5)
-            else:
-                log_event("⚠️ Port still busy after 5 sec, forcing restart anyway.")
-
-            # Let's restart the server
-            ensure_comfyui_running(self.comfyui_path)
-
-            # We check when the server will go up (up to 15 seconds)
-            log_event("⏳ Waiting for server to respond...")
-            for i in range(30):
-                time.sleep(0.5)
-                if is_port_open(COMFYUI_PORT):
+                else:
+                    log_event("⚠️ Port still busy after 5 sec, forcing restart anyway.")
+
+                # Let's restart the server
+                instance = ensure_comfyui_running(
+                    self.comfyui_path, instance_id=self.instance_id
+                )
+                ev["build_id"] = instance.build_id
+
+                # We check when the server will go up (up to 15 seconds)
+                log_event("⏳ Waiting for server to respond...")
+                if wait_until_ready(self.instance_id, timeout=15):
                     log_event("✅ ComfyUI is back online.")
-                    break
-
-            else:
-                log_event("⚠️ ComfyUI did not respond after restart.")
+                    ev["outcome"] = "online"
+                else:
+                    log_event("⚠️ ComfyUI did not respond after restart.")
+                    ev["outcome"] = "timeout"
 
             # We return the status and unlock the button
             QTimer.singleShot(0, lambda: self.status_label.setText("🟢 Online"))
@@ -181,7 +204,7 @@ class ComfyBrowser(QMainWindow):
         if not reply:
             return
 
-        stop_comfyui_hard()
+        stop_comfyui_hard(instance_id=self.instance_id)
         self.header.status_label.setText("Offline")
         self.header.status_label.setStyleSheet("color: red; font-weight: bold;")
         log_event("🟥 ComfyUI completely stopped by the user.")
@@ -257,7 +280,7 @@ class ComfyBrowser(QMainWindow):
                 # Don't touch the status during the restart.
                 return
 
-            if is_port_open(COMFYUI_PORT):
+            if is_port_open(self.port):
                 self.status_label.setText("🟢 Online")
                 self.status_label.setStyleSheet("color: lightgreen; font-weight: bold;")
             else:
@@ -278,7 +301,12 @@ class ComfyBrowser(QMainWindow):
 
     def reload_comfy(self):
         self.load_comfy()
-        threading.Thread(target=ensure_comfyui_running, daemon=True).start()
+        threading.Thread(
+            target=ensure_comfyui_running,
+            args=(self.comfyui_path,),
+            kwargs={"instance_id": self.instance_id},
+            daemon=True,
+        ).start()
         if self.poll_callback:
             QTimer.singleShot(1000, self.poll_callback)
 
@@ -293,7 +321,7 @@ class ComfyBrowser(QMainWindow):
 
         self._exit_in_progress = True  # mark close sequence started
 
-        user_config = load_user_config()
+        user_config = config_snapshot()
         ask = user_config.get("ask_on_exit", True)
         mode = user_config.get("exit_mode", "always_stop")
 
@@ -310,17 +338,18 @@ class ComfyBrowser(QMainWindow):
             # YES → stop server + exit
             if choice == "yes":
                 log_event("🟥 User chose: YES — stopping ComfyUI and exiting.")
-                stop_comfyui_hard()
+                stop_all_instances()
                 self._close_settings_if_open()
-                save_user_config(user_config)
+                flush_user_config()
                 event.accept()
                 return
 
             # NO → exit, but keep server running
             elif choice == "no":
                 log_event("🟢 User chose: NO — exiting without stopping ComfyUI.")
+                keep_instances_after_exit()
                 self._close_settings_if_open()
-                save_user_config(user_config)  # ← важно!
+                flush_user_config()  # ← важно!
                 event.accept()
                 return
 
@@ -336,17 +365,18 @@ class ComfyBrowser(QMainWindow):
         # ─────────────────────────────
         if mode == "always_stop":
             log_event("🟥 Auto mode: always_stop — stopping ComfyUI.")
-            stop_comfyui_hard()
+            stop_all_instances()
 
         elif mode == "never_stop":
             log_event("🟢 Auto mode: never_stop — leaving ComfyUI running.")
+            keep_instances_after_exit()
 
         else:
             log_event(f"⚠️ Unknown exit mode: '{mode}' — defaulting to always_stop.")
-            stop_comfyui_hard()
+            stop_all_instances()
 
-        # Save user config anyway (important!)
-        save_user_config(user_config)
+        # Make sure pending config changes are on disk (important!)
+        flush_user_config()
         self._close_settings_if_open()
 
         try:
@@ -361,7 +391,9 @@ class ComfyBrowser(QMainWindow):
         """Open (or raise) the ComfyUI console log window."""
         try:
             if not hasattr(self, "console_window") or self.console_window is None:
-                self.console_window = ConsoleWindow(self)
+                self.console_window = ConsoleWindow(
+                    self, instance_console(self.instance_id)
+                )
             self.console_window.show()
             self.console_window.raise_()
             self.console_window.activateWindow()
@@ -385,14 +417,14 @@ class ComfyBrowser(QMainWindow):
         self.ui_state = "STARTING_COMFY"
 
         # ── SHOW SPLASH ─────────────────────
-        cfg = load_user_config()
+        cfg = config_snapshot()
         if cfg.get("show_splash", True):
             if not hasattr(self, "splash") or self.splash is None:
                 self.splash = LauncherSplashVideo(SPLASH_PATH)
                 self.splash.show()
 
         self.thread = QThread()
-        self.worker = ComfyLoaderWorker(self.comfyui_path)
+        self.worker = ComfyLoaderWorker(self.comfyui_path, instance_id=self.instance_id)
 
         self.worker.moveToThread(self.thread)
         self.thread.started.connect(self.worker.run)  # type: ignore
@@ -410,7 +442,7 @@ class ComfyBrowser(QMainWindow):
             self.splash.finish()
             self.splash = None
 
-        url = f"http://127.0.0.1:{COMFYUI_PORT}"
+        url = f"http://127.0.0.1:{self.port}"
         self.browser = WebView2Widget(url)
         self.browser.loaded.connect(self.on_load_finished)
 
@@ -523,9 +555,7 @@ class ComfyBrowser(QMainWindow):
         if user_wants_update:
             webbrowser.open(release_url)
         else:
-            config = load_user_config()
-            config["last_update_check"] = datetime.utcnow().isoformat()
-            save_user_config(config)
+            StateStore.set("last_update_check", datetime.utcnow().isoformat())
 
     def on_update_not_found(self):
         print("No updates found")
@@ -20,6 +20,7 @@ from ui.theme.manager import THEME
 from config import load_user_config, ICON_PATH, ICON_PATHS
 from ui.dialogs.setup_window import SetupWindow
 from ui.header import colorize_svg
+from utils.state_store import StateStore
 
 try:
     from config import DOODLE_ICON_PATHS, DEFAULT_DOODLE_ID
@@ -45,7 +46,7 @@ class BuildManagerDialog(QDialog):
 
         data = load_user_config()
         self.builds = data.get("builds", []) or []
-        self.last_used_id = data.get("last_used_build_id", "")
+        self.last_used_id = StateStore.get("last_used_build_id", "")
 
         root = QVBoxLayout(self)
         root.setContentsMargins(0, 0, 0, 0)
@@ -356,7 +357,7 @@ class BuildManagerDialog(QDialog):
     def _reload_builds(self):
         data = load_user_config()
         self.builds = data.get("builds", []) or []
-        self.last_used_id = data.get("last_used_build_id", "")
+        self.last_used_id = StateStore.get("last_used_build_id", "")
 
         # очистить list_layout (кроме stretch)
         while self.list_layout.count():
@@ -1,3 +1,5 @@
+from contextlib import contextmanager
+
 from PyQt6.QtWidgets import (
     QWidget,
     QVBoxLayout,
@@ -6,22 +8,36 @@ from PyQt6.QtWidgets import (
     QPushButton,
     QPlainTextEdit,
     QFrame,
+    QLineEdit,
 )
-from PyQt6.QtCore import Qt, QTimer, QRectF
+from PyQt6.QtCore import Qt, QRectF, QThread, QTimer
 from PyQt6.QtGui import QPainterPath, QRegion, QTextCursor
 
 from ui.theme.manager import THEME
 from ui.header import colorize_svg
 from config import HEAD_ICON_PATHS
 from utils.console_buffer import ConsoleBuffer
+from utils.console_feed import ConsoleFeed
+from workers.console_search import ConsoleSearchWorker
+
+# (label, preset id) for the quick filter buttons
+SEARCH_PRESETS = [
+    ("Warnings", "warnings"),
+    ("Errors", "errors"),
+    ("Tracebacks", "tracebacks"),
+    ("Prompts", "prompts"),
+]
 
 
 class ConsoleWindow(QWidget):
     """Separate window to view ComfyUI console logs."""
 
-    def __init__(self, parent=None):
+    MAX_BLOCKS = 10000
+
+    def __init__(self, parent=None, buffer: type[ConsoleBuffer] = ConsoleBuffer):
         super().__init__(parent)
         self._drag_pos = None
+        self._buffer = buffer  # the console of the instance shown
         self.setWindowTitle("ComfyUI Console")
         self.setFixedSize(900, 600)
         self.setWindowFlags(
@@ -30,6 +46,7 @@ class ConsoleWindow(QWidget):
             | Qt.WindowType.WindowSystemMenuHint
         )
         self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose, False)
+        self._live = ""  # text of the last (still rewriting) block, if shown
 
         c = THEME.colors
 
@@ -97,29 +114,77 @@ class ConsoleWindow(QWidget):
         # ─── Log area ──────────────────────────────────
         self.text_edit = QPlainTextEdit()
         self.text_edit.setReadOnly(True)
+        # Append-only view: Qt drops the oldest blocks itself, no undo history
+        self.text_edit.setMaximumBlockCount(self.MAX_BLOCKS)
+        self.text_edit.setUndoRedoEnabled(False)
         self.text_edit.setStyleSheet(self._build_text_style())
         self.text_edit.setContextMenuPolicy(Qt.ContextMenuPolicy.DefaultContextMenu)
 
+        # ─── Search results (shown instead of the log) ─
+        self.results_edit = QPlainTextEdit()
+        self.results_edit.setReadOnly(True)
+        self.results_edit.setMaximumBlockCount(ConsoleSearchWorker.MAX_RESULTS)
+        self.results_edit.setUndoRedoEnabled(False)
+        self.results_edit.setStyleSheet(self._build_text_style())
+        self.results_edit.setVisible(False)
+
+        # ─── Search / filter bar ───────────────────────
+        search_bar = QHBoxLayout()
+        search_bar.setContentsMargins(14, 8, 14, 0)
+        search_bar.setSpacing(6)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("Search console (regex)…")
+        self.search_edit.setClearButtonEnabled(True)
+        search_bar.addWidget(self.search_edit, 1)
+
+        self.preset_buttons = {}
+        for label, preset in SEARCH_PRESETS:
+            btn = QPushButton(label)
+            btn.setCheckable(True)
+            btn.clicked.connect(  # type: ignore
+                lambda checked, p=preset: self._on_preset_clicked(p, checked)
+            )
+            self.preset_buttons[preset] = btn
+            search_bar.addWidget(btn)
+
+        self.search_status = QLabel()
+        self.search_status.setMinimumWidth(90)
+        self.search_status.setAlignment(
+            Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+        )
+        search_bar.addWidget(self.search_status)
+
         log_container = QHBoxLayout()
 
         log_container.setContentsMargins(14, 8, 14, 14)
         log_container.addWidget(self.text_edit)
+        log_container.addWidget(self.results_edit)
 
         layout.addWidget(header)
+        layout.addLayout(search_bar)
         layout.addLayout(log_container)
 
-        # ─── Timer for updates ─────────────────────────
-        self._timer = QTimer(self)
-        self._timer.setInterval(500)  # ms
-        self._timer.timeout.connect(self._refresh_logs)  # type: ignore
-        self._timer.start()
+        # ─── Search runs off the Qt thread, debounced while typing ─
+        self._search_worker = None
+        self._search_jobs = []  # (thread, worker) kept alive until finished
+        self._search_timer = QTimer(self)
+        self._search_timer.setSingleShot(True)
+        self._search_timer.setInterval(250)
+        self._search_timer.timeout.connect(self._start_search)  # type: ignore
+        self.search_edit.textChanged.connect(self._search_timer.start)  # type: ignore
+
+        # ─── Batched updates from the reader thread ────
+        # the widget keeps MAX_BLOCKS lines, so the first load is capped too
+        self._feed = ConsoleFeed(self, max_lines=self.MAX_BLOCKS, buffer=buffer)
+        self._feed.lines_ready.connect(self._append_lines)  # type: ignore
+        self._feed.live_changed.connect(self._set_live_line)  # type: ignore
 
         self._apply_theme()
         THEME.themeChanged.connect(self._apply_theme)
 
         self._round_corners(10)
         self._center()
-        self._refresh_logs()
 
     # ─────────────────────────────────────────────────
     def _build_text_style(self) -> str:
@@ -166,14 +231,178 @@ class ConsoleWindow(QWidget):
             f"background-color: {c['bg_header']}; color: {c['text_primary']};"
         )
         self.text_edit.setStyleSheet(self._build_text_style())
+        self.results_edit.setStyleSheet(self._build_text_style())
+        for btn in self.preset_buttons.values():
+            btn.setStyleSheet(self._build_preset_style())
+
+    def _build_preset_style(self) -> str:
+        c = THEME.colors
+        return f"""
+            QPushButton {{
+                background: transparent;
+                color: {c['text_secondary']};
+                border: 1px solid {c['border_color']};
+                border-radius: 6px;
+                padding: 3px 8px;
+            }}
+            QPushButton:hover {{
+                border-color: {c['accent']};
+            }}
+            QPushButton:checked {{
+                background-color: {c['accent']};
+                color: {c['text_inverse']};
+                border-color: {c['accent']};
+            }}
+        """
+
+    # ── Search ───────────────────────────────────────
+    def _active_preset(self) -> str | None:
+        for preset, btn in self.preset_buttons.items():
+            if btn.isChecked():
+                return preset
+        return None
+
+    def _on_preset_clicked(self, preset: str, checked: bool):
+        # Presets are exclusive, but all of them may be off
+        if checked:
+            for other, btn in self.preset_buttons.items():
+                if other != preset:
+                    btn.setChecked(False)
+        self._start_search()
+
+    def _start_search(self):
+        self._search_timer.stop()
+        self._cancel_search()
+
+        query = self.search_edit.text().strip()
+        preset = self._active_preset()
+        searching = bool(query or preset)
+
+        self.results_edit.setVisible(searching)
+        self.text_edit.setVisible(not searching)
+        self.results_edit.clear()
+        self.search_status.setText("Searching…" if searching else "")
+        if not searching:
+            return
+
+        thread = QThread(self)
+        worker = ConsoleSearchWorker(query, preset, self._buffer)
+        worker.moveToThread(thread)
+        thread.started.connect(worker.run)  # type: ignore
+
+        worker.results.connect(self._on_search_results)
+        worker.finished.connect(self._on_search_finished)
+        worker.finished.connect(thread.quit)
+        thread.finished.connect(self._on_search_thread_finished)  # type: ignore
+
+        self._search_worker = worker
+        self._search_jobs.append((thread, worker))
+        thread.start()
+
+    def _cancel_search(self):
+        if self._search_worker is not None:
+            self._search_worker.stop()
+            self._search_worker = None
+
+    def _on_search_thread_finished(self):
+        thread = self.sender()
+        self._search_jobs = [job for job in self._search_jobs if job[0] is not thread]
+        thread.deleteLater()
+
+    def _on_search_results(self, lines: list):
+        # Results of a cancelled scan may still be queued — drop them
+        if self.sender() is not self._search_worker:
+            return
+        self.results_edit.appendPlainText("".join(lines).rstrip("\n"))
+
+    def _on_search_finished(self, found: int):
+        if self.sender() is not self._search_worker:
+            return
+        suffix = "+" if found >= ConsoleSearchWorker.MAX_RESULTS else ""
+        self.search_status.setText(f"{found}{suffix} matches")
 
     # ─────────────────────────────────────────────────
-    def _refresh_logs(self):
-        text = ConsoleBuffer.get_all()
-        # To avoid flashing, we update only if there is a real change.
-        if text != self.text_edit.toPlainText():
-            self.text_edit.setPlainText(text)
-            self.text_edit.moveCursor(QTextCursor.MoveOperation.End)
+    def _append_lines(self, lines: list):
+        # Only the new tail is appended, one batch per frame. The live
+        # progress line stays last, so it is lifted off and re-added after.
+        text = "".join(lines)
+        if text.endswith("\n"):
+            text = text[:-1]  # only the last line's own break; blank lines stay
+        with self._keep_scroll() as added:
+            added[0] -= self._remove_live_block()
+            added[0] += self._append_block(text)
+            if self._live:
+                added[0] += self._append_block(self._live)
+
+    def _set_live_line(self, text: str):
+        # A progress rewrite updates the last block in place
+        with self._keep_scroll() as added:
+            if self._live and text:
+                cursor = self._last_block_cursor()
+                cursor.insertText(text)
+            else:
+                added[0] -= self._remove_live_block()
+                if text:
+                    added[0] += self._append_block(text)
+        self._live = text
+
+    def _last_block_cursor(self) -> QTextCursor:
+        # A document cursor — editing through it keeps the user's selection
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.movePosition(
+            QTextCursor.MoveOperation.StartOfBlock, QTextCursor.MoveMode.KeepAnchor
+        )
+        return cursor
+
+    def _append_block(self, text: str) -> int:
+        """Appends text as new block(s); returns how many blocks were added."""
+        # appendPlainText reuses the single block of an empty document
+        reused = self.text_edit.document().isEmpty()
+        self.text_edit.appendPlainText(text)
+        return text.count("\n") + (0 if reused else 1)
+
+    def _remove_live_block(self) -> int:
+        """Removes the live line; returns how many blocks went away."""
+        if not self._live:
+            return 0
+        cursor = self._last_block_cursor()
+        if cursor.blockNumber() == 0:
+            # No line break in front: the document is left empty and the
+            # next append reuses its block
+            cursor.removeSelectedText()
+            return 0
+        # take the line break in front of the block too
+        cursor.movePosition(
+            QTextCursor.MoveOperation.PreviousCharacter,
+            QTextCursor.MoveMode.KeepAnchor,
+        )
+        cursor.removeSelectedText()
+        return 1
+
+    @contextmanager
+    def _keep_scroll(self):
+        """
+        Follows the tail only while the view is scrolled to the bottom;
+        otherwise keeps the lines the user is reading in place, even when
+        maximumBlockCount trims blocks off the top. The body records the
+        net number of blocks it appended in the yielded one-item list.
+        """
+        bar = self.text_edit.verticalScrollBar()
+        doc = self.text_edit.document()
+        follow = bar.value() >= bar.maximum() - 1
+        value = bar.value()
+        blocks_before = doc.blockCount()
+        added = [0]
+        try:
+            yield added
+        finally:
+            if follow:
+                bar.setValue(bar.maximum())
+            else:
+                # QPlainTextEdit scrolls by blocks; shift by what was trimmed
+                trimmed = max(0, blocks_before + added[0] - doc.blockCount())
+                bar.setValue(max(0, value - trimmed))
 
     # ── geometry/drag/rounding ───────────────────────
     def _center(self):
@@ -16,8 +16,7 @@ from PyQt6.QtCore import Qt, QSize, QRectF
 from PyQt6.QtGui import QIcon, QPainterPath, QRegion
 
 from config import (
-    load_user_config,
-    save_user_config,
+    update_config,
     ICON_PATH,
     ICON_PATHS,
     DOODLE_ICON_PATHS,
@@ -26,6 +25,7 @@ from config import (
 from ui.header import colorize_svg
 from ui.theme.manager import THEME
 from utils.build_validation import is_valid_comfyui_build
+from utils.state_store import StateStore
 
 import os
 import uuid
@@ -369,13 +369,19 @@ class SetupWindow(QDialog):
             QMessageBox.warning(self, "Missing name", "Please enter a build name.")
             return
 
-        data = load_user_config()
+        update_config(self._save_build)
+        self.accept()
+
+    def _save_build(self, data: dict):
+        """Writes the entered build into the config (inside update_config)."""
+        path = self.path_edit.text().strip()
+        name = self.name_edit.text().strip()
         builds = data.get("builds", []) or []
 
         def apply_manager_defaults(selected_id: str):
             if self.mode == SetupMode.MANAGER:
                 data["comfyui_path"] = path
-                data["last_used_build_id"] = selected_id
+                StateStore.set("last_used_build_id", selected_id)
 
         # ── EDIT MODE: update by id ──
         if self.edit_build_id:
@@ -401,10 +407,7 @@ class SetupWindow(QDialog):
                 )
 
             apply_manager_defaults(self.edit_build_id)
-
             data["builds"] = builds
-            save_user_config(data)
-            self.accept()
             return
 
         # ── ADD MODE: keep legacy dedupe-by-path ──
@@ -415,10 +418,7 @@ class SetupWindow(QDialog):
                 b["startup_mode"] = self.selected_startup_mode
 
                 apply_manager_defaults(str(b.get("id", "")))
-
                 data["builds"] = builds
-                save_user_config(data)
-                self.accept()
                 return
 
         build_id = str(uuid.uuid4())
@@ -435,9 +435,6 @@ class SetupWindow(QDialog):
         data["builds"] = builds
         apply_manager_defaults(build_id)
 
-        save_user_config(data)
-        self.accept()
-
     def _round_corners(self, radius: int):
         from PyQt6.QtGui import QPainterPath, QRegion
         from PyQt6.QtCore import QRectF
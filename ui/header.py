@@ -9,7 +9,7 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QPoint, pyqtSignal, QSize
 from PyQt6.QtGui import QIcon, QPainter, QPixmap, QColor
 
-from config import ICON_PATH, ICON_PATHS, HEAD_ICON_PATHS, load_user_config
+from config import ICON_PATH, ICON_PATHS, HEAD_ICON_PATHS, config_snapshot
 from ui.theme.manager import THEME
 
 
@@ -47,7 +47,7 @@ class HeaderBar(QWidget):
         self.setAttribute(Qt.WidgetAttribute.WA_StyledBackground, True)
         self.setFixedHeight(46)
 
-        cfg = load_user_config()
+        cfg = config_snapshot()
         show_cmd = cfg.get("show_cmd", True)
         self.use_internal_console = not show_cmd
 
@@ -121,6 +121,14 @@ class HeaderBar(QWidget):
         )
         layout.addWidget(self.status_label)
 
+        # generation progress parsed from the console (internal console only)
+        self.progress_label = QLabel()
+        self.progress_label.setStyleSheet(
+            f"color: {THEME.colors['text_secondary']}; padding: 3px 8px;"
+        )
+        self.progress_label.setVisible(False)
+        layout.addWidget(self.progress_label)
+
         layout.addSpacerItem(
             QSpacerItem(25, 0, QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Minimum)
         )
@@ -200,6 +208,18 @@ class HeaderBar(QWidget):
         self._apply_theme()
         THEME.themeChanged.connect(self._apply_theme)
 
+    def set_progress(self, progress):
+        """Shows the current sampling progress (ProgressInfo) or hides it on None."""
+        if progress is None:
+            self.progress_label.setVisible(False)
+            return
+
+        text = f"{progress.step}/{progress.total} ({progress.percent}%)"
+        if progress.it_per_sec:
+            text += f" · {progress.it_per_sec:.2f} it/s"
+        self.progress_label.setText(text)
+        self.progress_label.setVisible(True)
+
     def _on_reload_clicked(self):
         if hasattr(self.parent, "browser") and self.parent.browser:
             self.parent.browser.reload()
@@ -251,6 +271,10 @@ class HeaderBar(QWidget):
         """
         )
 
+        self.progress_label.setStyleSheet(
+            f"color: {c['text_secondary']}; padding: 3px 8px;"
+        )
+
         # Re-creating icons for a new theme
         self.btn_min.setIcon(
             colorize_svg(
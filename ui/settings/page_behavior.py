@@ -7,7 +7,7 @@ from PyQt6.QtWidgets import (
     QButtonGroup,
     QFrame,
 )
-from config import load_user_config, save_user_config
+from config import load_user_config, update_config
 from ui.theme.manager import THEME
 from ui.dialogs.messagebox import MessageBox as MB
 
@@ -109,9 +109,7 @@ class BehaviorSettingsPage(QWidget):
 
     def apply(self) -> bool:
         data = self._current_data()
-        cfg = load_user_config()
-        cfg.update(data)
-        save_user_config(cfg)
+        update_config(lambda cfg: cfg.update(data))
 
         self._saved = data
         self._set_dirty(False)
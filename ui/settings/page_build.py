@@ -13,8 +13,8 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QSize
 from PyQt6.QtGui import QIcon, QFontMetrics
 from config import (
+    config_transaction,
     load_user_config,
-    save_user_config,
     ICON_PATHS,
     OTHER_ICONS,
 )
@@ -22,6 +22,8 @@ from ui.header import colorize_svg
 from ui.theme.manager import THEME
 from ui.dialogs.messagebox import MessageBox as MB
 from ui.dialogs.setup_window import SetupWindow, SetupMode
+from utils.cuda_probe import CudaProbe
+from utils.state_store import StateStore
 
 import webbrowser
 import os
@@ -207,7 +209,7 @@ class BuildSettingsPage(QWidget):
 
         cfg = load_user_config()
         builds = cfg.get("builds", []) or []
-        last_id = cfg.get("last_used_build_id", "")
+        last_id = StateStore.get("last_used_build_id", "")
 
         self._clear_layout(self.builds_layout)
 
@@ -375,15 +377,16 @@ class BuildSettingsPage(QWidget):
     def _on_edit_build(self, build: dict):
         dlg = SetupWindow(self, build=build, mode=SetupMode.SETTINGS)
         if dlg.exec() == QDialog.DialogCode.Accepted:
+            CudaProbe.invalidate()  # the build (or its GPU setup) may have changed
             self._refresh_builds_list()
 
     def _sanitize_last_used(self, cfg: dict) -> None:
         """Ensure last_used_build_id points to an existing build or is empty."""
         builds = cfg.get("builds", []) or []
         ids = {str(b.get("id", "")) for b in builds}
-        last_id = str(cfg.get("last_used_build_id", "") or "")
+        last_id = str(StateStore.get("last_used_build_id", "") or "")
         if last_id and last_id not in ids:
-            cfg["last_used_build_id"] = ""
+            StateStore.set("last_used_build_id", "")
 
     def _on_delete_build(self, build: dict):
         build_id = str(build.get("id", ""))
@@ -396,20 +399,15 @@ class BuildSettingsPage(QWidget):
         if not MB.ask_yes_no(self.window(), "Delete build", f"Delete build “{name}”?"):
             return
 
-        cfg = load_user_config()
-        builds = cfg.get("builds", []) or []
-
-        # remove by id
-        cfg["builds"] = [b for b in builds if str(b.get("id", "")) != build_id]
-
-        # if deleted last_used -> clear (do NOT auto-pick another)
-        if str(cfg.get("last_used_build_id", "") or "") == build_id:
-            cfg["last_used_build_id"] = ""
+        with config_transaction() as cfg:
+            builds = cfg.get("builds", []) or []
 
-        # if last_used became invalid for any reason -> clear
-        self._sanitize_last_used(cfg)
+            # remove by id
+            cfg["builds"] = [b for b in builds if str(b.get("id", "")) != build_id]
 
-        save_user_config(cfg)
+            # if deleted last_used -> clear (do NOT auto-pick another);
+            # also if last_used became invalid for any reason
+            self._sanitize_last_used(cfg)
 
         # update UI
         self._refresh_builds_list()
@@ -1,17 +1,17 @@
-import os
 from PyQt6.QtWidgets import (
     QWidget,
     QVBoxLayout,
     QLabel,
-    QTextEdit,
+    QPlainTextEdit,
     QPushButton,
     QHBoxLayout,
     QFrame,
 )
 from PyQt6.QtGui import QTextCursor, QIcon
-from PyQt6.QtCore import Qt, QSize
+from PyQt6.QtCore import Qt, QSize, QTimer
 from config import OTHER_ICONS
-from utils.logger import LOG_FILE, log_event
+from utils.logger import LOG_FILE, clear_log, flush_logs, log_event
+from utils.log_tail import LogTailReader
 from ui.header import colorize_svg
 from ui.theme.manager import THEME
 from ui.dialogs.messagebox import MessageBox as MB
@@ -20,8 +20,11 @@ from ui.dialogs.messagebox import MessageBox as MB
 class LogsSettingsPage(QWidget):
     """Elegant launcher logs page."""
 
+    LIVE_TAIL_MS = 1000
+
     def __init__(self, parent=None):
         super().__init__(parent)
+        self._reader = LogTailReader(LOG_FILE)
 
         # ─── Basic layout ───────────────────────────────
         layout = QVBoxLayout(self)
@@ -34,8 +37,10 @@ class LogsSettingsPage(QWidget):
         layout.addWidget(title)
 
         # ─── Log text field ─────────────────────────
-        self.text_edit = QTextEdit()
+        # Plain text, tail first: older pages are loaded when scrolled to the top
+        self.text_edit = QPlainTextEdit()
         self.text_edit.setReadOnly(True)
+        self.text_edit.setUndoRedoEnabled(False)
         self.text_edit.setStyleSheet(self._build_textedit_style())
         log_container = QHBoxLayout()
         log_container.setContentsMargins(14, 0, 0, 0)  # ← твой идеальный отступ
@@ -54,6 +59,12 @@ class LogsSettingsPage(QWidget):
         btn_layout.setAlignment(Qt.AlignmentFlag.AlignRight)
         btn_layout.setSpacing(10)
 
+        # Live tail toggle
+        self.btn_live = QPushButton("Live")
+        self.btn_live.setCheckable(True)
+        self.btn_live.setChecked(True)
+        self.btn_live.setFixedHeight(36)
+
         # Refresh button
         self.btn_refresh = QPushButton()
         self.btn_refresh.setIcon(
@@ -83,7 +94,7 @@ class LogsSettingsPage(QWidget):
         self.btn_clear.setFixedSize(36, 36)
 
         # Apply common style
-        for btn in (self.btn_refresh, self.btn_clear):
+        for btn in (self.btn_live, self.btn_refresh, self.btn_clear):
             btn.setStyleSheet(
                 f"""
                 QPushButton {{
@@ -95,13 +106,14 @@ class LogsSettingsPage(QWidget):
                     background-color: {THEME.colors['accent']};
                     border-color: {THEME.colors['accent']};
                 }}
-                QPushButton:pressed {{
+                QPushButton:pressed, QPushButton:checked {{
                     background-color: {THEME.colors['accent_hover']};
                 }}
                 """
             )
             btn_layout.addWidget(btn)
 
+        self.btn_live.setToolTip("Follow new log entries")
         self.btn_refresh.setToolTip("Refresh log")
         self.btn_clear.setToolTip("Clear log")
 
@@ -110,6 +122,15 @@ class LogsSettingsPage(QWidget):
         # ─── Signals ──────────────────────────────────────
         self.btn_refresh.clicked.connect(self.load_logs)  # type: ignore
         self.btn_clear.clicked.connect(self.clear_logs)  # type: ignore
+        self.btn_live.toggled.connect(self._update_live_tail)  # type: ignore
+        self.text_edit.verticalScrollBar().valueChanged.connect(  # type: ignore
+            self._on_scrolled
+        )
+
+        # ─── Live tail: picks up appended bytes by offset ─
+        self._live_timer = QTimer(self)
+        self._live_timer.setInterval(self.LIVE_TAIL_MS)
+        self._live_timer.timeout.connect(self._poll_new_lines)  # type: ignore
 
         # ─── Initial loading ───────────────────────────
         self.load_logs()
@@ -121,7 +142,7 @@ class LogsSettingsPage(QWidget):
     def _build_textedit_style(self) -> str:
         c = THEME.colors
         return f"""
-            QTextEdit {{
+            QPlainTextEdit {{
                 background-color: {c['bg_input']};
                 color: {c['text_secondary']};
                 border: 1px solid {c['border_color']};
@@ -130,7 +151,7 @@ class LogsSettingsPage(QWidget):
                 font-size: 12px;
                 padding: 10px;
             }}
-            QTextEdit:focus {{
+            QPlainTextEdit:focus {{
                 border-color: {c['accent']};
             }}
         """
@@ -142,7 +163,7 @@ class LogsSettingsPage(QWidget):
             f"background-color: {c['bg_header']}; color: {c['text_primary']};"
         )
         self.text_edit.setStyleSheet(self._build_textedit_style())
-        for btn in (self.btn_refresh, self.btn_clear):
+        for btn in (self.btn_live, self.btn_refresh, self.btn_clear):
             btn.setStyleSheet(
                 f"""
                 QPushButton {{
@@ -152,7 +173,7 @@ class LogsSettingsPage(QWidget):
                     border-radius: 6px;
                     transition: all 0.2s ease-in-out;
                 }}
-                QPushButton:hover {{
+                QPushButton:hover, QPushButton:checked {{
                     background-color: {c['accent']};
                     color: {c['text_inverse']};
                     border-color: {c['accent']};
@@ -162,19 +183,60 @@ class LogsSettingsPage(QWidget):
 
     # ─────────────────────────────────────────────────────
     def load_logs(self):
-        """Loads the log into a text field."""
-        if not os.path.exists(LOG_FILE):
+        """Loads the last page of the log into the text field."""
+        flush_logs(0.5)
+        text = self._reader.read_tail()
+        if not text and not self._reader.has_older:
             self.text_edit.setPlainText("No logs yet.")
             return
 
-        try:
-            with open(LOG_FILE, "r", encoding="utf-8") as f:
-                content = f.read()
-            self.text_edit.setPlainText(content or "Log file is empty.")
-            self.text_edit.moveCursor(QTextCursor.MoveOperation.End)
-            log_event("📖 Logs page refreshed.")
-        except Exception as e:
-            MB.error(self.window(), "Error", f"Failed to read log file:\n{e}")
+        self.text_edit.setPlainText(text.rstrip("\n"))
+        self.text_edit.moveCursor(QTextCursor.MoveOperation.End)
+
+    def _on_scrolled(self, value: int):
+        # Reaching the top pulls in the previous page
+        if value == 0 and self._reader.has_older:
+            self._load_older_page()
+
+    def _load_older_page(self):
+        older = self._reader.read_older()
+        if not older:
+            return
+        bar = self.text_edit.verticalScrollBar()
+        cursor = QTextCursor(self.text_edit.document())
+        cursor.movePosition(QTextCursor.MoveOperation.Start)
+        cursor.insertText(older)
+        # keep the line the user was looking at in place (scrolling is per block)
+        bar.setValue(bar.value() + older.count("\n"))
+
+    def _poll_new_lines(self):
+        new = self._reader.read_new()
+        if new is None:
+            # rotated or cleared — start over from the new file's tail
+            self.load_logs()
+            return
+        if not new:
+            return
+
+        bar = self.text_edit.verticalScrollBar()
+        follow = bar.value() >= bar.maximum() - 1
+        value = bar.value()
+        self.text_edit.appendPlainText(new.rstrip("\n"))
+        bar.setValue(bar.maximum() if follow else value)
+
+    def _update_live_tail(self, *args):
+        if self.btn_live.isChecked() and self.isVisible():
+            self._live_timer.start()
+        else:
+            self._live_timer.stop()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self._update_live_tail()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self._update_live_tail()
 
     def clear_logs(self):
         """Clears the log with confirmation."""
@@ -183,8 +245,9 @@ class LogsSettingsPage(QWidget):
         ):
             return
         try:
-            open(LOG_FILE, "w", encoding="utf-8").close()
+            clear_log()
             log_event("🧹 Log file cleared by user.")
             self.text_edit.setPlainText("Log cleared.")
+            self._reader.read_tail()
         except Exception as e:
             MB.error(self.window(), "Error", f"Failed to clear logs:\n{e}")
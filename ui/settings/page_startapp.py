@@ -1,6 +1,6 @@
 from PyQt6.QtCore import pyqtSignal
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QCheckBox, QHBoxLayout
-from config import load_user_config, save_user_config
+from config import load_user_config, update_config
 from ui.theme.manager import THEME
 from ui.dialogs.messagebox import MessageBox as MB
 
@@ -97,9 +97,7 @@ class StartAppSettingsPage(QWidget):
             "show_cmd": self.cb_show_cmd.isChecked(),
             "show_splash": self.cb_show_splash.isChecked(),
         }
-        cfg = load_user_config()
-        cfg.update(data)
-        save_user_config(cfg)
+        update_config(lambda cfg: cfg.update(data))
 
         self._saved.update(data)
         self._set_dirty(False)
@@ -1,11 +1,9 @@
-import json
-import os
 from PyQt6.QtCore import QObject, pyqtSignal
 from PyQt6.QtWidgets import QApplication
 
 from ui.theme.tokens import THEMES
 from ui.theme.theme_registry import REGISTRY
-from config import USER_CONFIG_PATH as CONFIG_PATH
+from config import config_snapshot, update_config
 from utils.logger import log_event
 
 _ = REGISTRY
@@ -141,26 +139,12 @@ class ThemeManager(QObject):
     # ─── Saving and loading ─────────────────────────
     def _save_last_theme(self):
         """Saves the selected theme to user_config.json."""
-        try:
-            os.makedirs(os.path.dirname(CONFIG_PATH), exist_ok=True)
-            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            data = {}
-
-        data["theme"] = self._active_name
-        with open(CONFIG_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        update_config(lambda cfg: cfg.update(theme=self._active_name))
 
     def _load_last_theme(self) -> str:
         """Loads the theme from user_config.json."""
-        try:
-            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            theme = data.get("theme", "dark")
-            return theme if theme in self._themes else "dark"
-        except Exception:
-            return "dark"
+        theme = config_snapshot().get("theme", "dark")
+        return theme if theme in self._themes else "dark"
 
 
 # Singleton
@@ -0,0 +1,49 @@
+import json
+import urllib.error
+import urllib.request
+
+# Small client for the ComfyUI HTTP endpoints the launcher needs to stop it
+# politely. Every call is best effort: None / False when the server does
+# not answer.
+
+TIMEOUT_S = 2.0
+
+
+def interrupt(port: int) -> bool:
+    """Stops the prompt that is executing right now."""
+    return _post(port, "/interrupt", {}) is not None
+
+
+def clear_queue(port: int) -> bool:
+    """Drops the prompts that are waiting (the running one is not affected)."""
+    return _post(port, "/queue", {"clear": True}) is not None
+
+
+def queue_state(port: int) -> tuple[int, int] | None:
+    """(running, pending) prompt counts, or None if the server does not answer."""
+    data = _request(port, "/queue")
+    if not isinstance(data, dict):
+        return None
+    return len(data.get("queue_running") or []), len(data.get("queue_pending") or [])
+
+
+def _post(port: int, path: str, payload: dict):
+    return _request(port, path, json.dumps(payload).encode("utf-8"))
+
+
+def _request(port: int, path: str, body: bytes | None = None):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}{path}",
+        data=body,
+        headers={"Content-Type": "application/json"} if body is not None else {},
+        method="POST" if body is not None else "GET",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=TIMEOUT_S) as response:
+            raw = response.read()
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+    try:
+        return json.loads(raw) if raw else {}
+    except ValueError:
+        return {}
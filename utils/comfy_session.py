@@ -0,0 +1,83 @@
+import time
+from dataclasses import asdict, dataclass, field
+
+import psutil
+
+from utils.state_store import StateStore
+
+
+@dataclass
+class ComfySession:
+    """
+    What the launcher knows about the ComfyUI it started. Persisted, so a
+    launcher started later (after "exit, keep server running") can find the
+    exact process tree again instead of scanning for it.
+    """
+
+    pid: int
+    create_time: float
+    port: int
+    instance_id: str = "main"
+    build_id: str = ""
+    mode: str = ""
+    args: list[str] = field(default_factory=list)
+    cwd: str = ""
+    log_path: str | None = None  # console output on disk, if it was captured
+    captured: bool = False
+    started_at: float = field(default_factory=time.time)
+    members: list[list] = field(default_factory=list)  # [[pid, create_time], …]
+    job: str | None = None  # Windows Job Object holding the tree, by name
+
+
+class SessionRecord:
+    """The persisted ComfySession of each instance, kept in the state store."""
+
+    STATE_KEY = "comfy_session"
+
+    @classmethod
+    def save(cls, session: ComfySession):
+        StateStore.set(cls._key(session.instance_id), asdict(session))
+
+    @classmethod
+    def load(cls, instance_id: str) -> ComfySession | None:
+        data = StateStore.get(cls._key(instance_id))
+        if not isinstance(data, dict):
+            return None
+        try:
+            return ComfySession(**data)
+        except TypeError:
+            return None  # written by an incompatible version
+
+    @classmethod
+    def clear(cls, instance_id: str):
+        StateStore.delete(cls._key(instance_id))
+
+    @classmethod
+    def instance_ids(cls) -> list[str]:
+        """Instances with a record (running, or not yet found to be gone)."""
+        prefix = cls._key("")
+        return [key[len(prefix) :] for key in StateStore.keys(prefix)]
+
+    @classmethod
+    def update_members(cls, instance_id: str, members: list[list]):
+        session = cls.load(instance_id)
+        if session is not None and session.members != members:
+            session.members = members
+            cls.save(session)
+
+    @classmethod
+    def _key(cls, instance_id: str) -> str:
+        return f"{cls.STATE_KEY}:{instance_id}"
+
+
+def same_process(pid: int, create_time: float) -> psutil.Process | None:
+    """The running process `pid` if it is the one started at `create_time`."""
+    try:
+        proc = psutil.Process(pid)
+        if abs(proc.create_time() - create_time) > 0.01:
+            return None  # the PID was recycled
+        if proc.status() == psutil.STATUS_ZOMBIE:
+            return None
+    except psutil.Error:
+        return None
+    return proc
@@ -1,25 +1,375 @@
-from typing import List
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, List, Tuple
+
+import psutil
+
+from utils.logger import LOG_DIR
+
+CONSOLE_LOG_DIR = os.path.join(LOG_DIR, "console")
+
+
+class _Segment:
+    """A run of consecutive lines; the unit of eviction."""
+
+    __slots__ = ("start", "lines", "size")
+
+    def __init__(self, start: int):
+        self.start = start  # sequence number of the first line
+        self.lines: List[str] = []
+        self.size = 0
+
+
+class SessionSpill:
+    """
+    Appends evicted console segments to a per-session file under the launcher
+    log directory. The file rotates into numbered parts once it grows past
+    `part_bytes`; only the last `keep_sessions` sessions of each tag (server
+    instance) are kept on disk. Sessions of a running launcher and pinned
+    ones (a reattached server's log) are never pruned.
+    """
+
+    _pinned: set = set()  # session names kept whatever their age
+
+    def __init__(
+        self,
+        directory: str = CONSOLE_LOG_DIR,
+        part_bytes: int = 32 * 1024 * 1024,
+        keep_sessions: int = 5,
+        tag: str = "",
+    ):
+        self.directory = directory
+        self.part_bytes = part_bytes
+        self.keep_sessions = keep_sessions
+        self.session = datetime.now().strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        if tag:
+            self.session += f"-{tag}"  # one file set per server instance
+        self._part = 0
+        self._part_size = 0
+        self._lock = threading.Lock()
+        self._started = False
+
+    @property
+    def path(self) -> str:
+        """The first file of this session (it may not exist yet)."""
+        return self._part_path(0)
+
+    @classmethod
+    def pin(cls, path: str) -> None:
+        """Keeps the session that `path` belongs to out of pruning."""
+        name = os.path.basename(path)
+        if name.startswith("console-") and name.endswith(".log"):
+            cls._pinned = cls._pinned | {_session_of(name)}
+
+    def files(self) -> List[str]:
+        """Session files written so far, oldest first."""
+        paths = [self._part_path(i) for i in range(self._part + 1)]
+        return [p for p in paths if os.path.exists(p)]
+
+    def write(self, segments: List[_Segment]) -> None:
+        if not segments:
+            return
+        data = "".join("".join(seg.lines) for seg in segments)
+        with self._lock:
+            try:
+                if not self._started:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._prune_sessions()
+                    self._started = True
+                if self._part_size and self._part_size + len(data) > self.part_bytes:
+                    self._part += 1
+                    self._part_size = 0
+                with open(self._part_path(self._part), "a", encoding="utf-8") as f:
+                    f.write(data)
+                self._part_size += len(data)
+            except OSError:
+                # Losing spilled history must never break the console itself
+                pass
+
+    def _part_path(self, part: int) -> str:
+        return os.path.join(self.directory, f"console-{self.session}.{part:03d}.log")
+
+    def _prune_sessions(self) -> None:
+        sessions: dict[str, List[str]] = {}
+        for name in os.listdir(self.directory):
+            if name.startswith("console-") and name.endswith(".log"):
+                sessions.setdefault(_session_of(name), []).append(name)
+
+        by_tag: dict[str, List[str]] = {}
+        for session in sessions:
+            if session in self._pinned or _launcher_alive(session):
+                continue
+            by_tag.setdefault(_tag_of(session), []).append(session)
+
+        own_tag = _tag_of(self.session)
+        for tag, names in by_tag.items():
+            # Names start with a timestamp, so lexical order is chronological;
+            # one slot is left for the session being started.
+            keep = self.keep_sessions - (1 if tag == own_tag else 0)
+            for session in sorted(names)[: max(0, len(names) - keep)]:
+                for name in sessions[session]:
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+
+
+def _session_of(file_name: str) -> str:
+    """console-<session>.<part>.log → <session>"""
+    return file_name[len("console-") :].rsplit(".", 2)[0]
+
+
+def _tag_of(session: str) -> str:
+    # session name: YYYYmmdd-HHMMSS-<launcher pid>[-<tag>]
+    parts = session.split("-", 3)
+    return parts[3] if len(parts) > 3 else ""
+
+
+def _launcher_alive(session: str) -> bool:
+    # Our own sessions and those of another running launcher are in use
+    try:
+        pid = int(session.split("-", 3)[2])
+    except (IndexError, ValueError):
+        return False
+    return pid == os.getpid() or psutil.pid_exists(pid)
 
 
 class ConsoleBuffer:
-    """In-memory buffer for ComfyUI console output."""
+    """
+    In-memory buffer for ComfyUI console output.
+
+    Every stored line gets a monotonic sequence number, so readers can ask
+    only for what appeared since their last read instead of the whole buffer.
+
+    Lines are grouped into segments; once the text held in memory exceeds
+    MAX_BYTES (measured in characters), whole segments are dropped from the
+    front and handed to the session spill file, so nothing is copied on trim.
+
+    One producer (the stdout reader thread) and any number of consumers may
+    use it concurrently. The lock is held only for the in-memory operation,
+    so the producer never waits on a consumer doing UI work.
+    """
 
-    _lines: List[str] = []
+    MAX_BYTES = 8 * 1024 * 1024
+    SEGMENT_BYTES = 64 * 1024
+
+    _segments: Deque[_Segment] = deque()
+    _size: int = 0  # characters held in memory
+    _next_seq: int = 0  # sequence number of the next line to be added
+    _lock = threading.Lock()
+    _spill: SessionSpill | None = SessionSpill()
+    _spill_tag: str = ""
+    # Evicted segments until their spill write is done: still in snapshot()
+    _in_flight: List[_Segment] = []
+
+    # Wake-up callbacks: fired once when data arrives after the last read,
+    # not once per line — consumers then drain in batches.
+    _listeners: List[Callable[[], None]] = []
+    _wake_pending: bool = False
+
+    # The line currently being rewritten with '\r' (not yet committed) and
+    # the progress parsed from the stream — both are updated in place.
+    _live: str = ""
+    _progress: Any = None
+
+    @classmethod
+    def create(cls, tag: str) -> type["ConsoleBuffer"]:
+        """
+        A separate buffer with the same API, e.g. for another server instance.
+        ConsoleBuffer itself stays the console of the main instance.
+        """
+        state = {
+            "_segments": deque(),
+            "_size": 0,
+            "_next_seq": 0,
+            "_lock": threading.Lock(),
+            "_spill": SessionSpill(tag=tag),
+            "_spill_tag": tag,
+            "_in_flight": [],
+            "_listeners": [],
+            "_wake_pending": False,
+            "_live": "",
+            "_progress": None,
+        }
+        return type(f"ConsoleBuffer[{tag}]", (cls,), state)
+
+    @classmethod
+    def configure(cls, max_bytes: int | None = None, spill: bool = True) -> None:
+        """Sets the in-memory budget and whether evicted output goes to disk."""
+        with cls._lock:
+            if max_bytes:
+                cls.MAX_BYTES = max(int(max_bytes), cls.SEGMENT_BYTES)
+            if not spill:
+                cls._spill = None
+            elif cls._spill is None:
+                cls._spill = SessionSpill(tag=cls._spill_tag)
 
     @classmethod
     def add(cls, text: str) -> None:
         if not text:
             return
-        cls._lines.append(text)
+        cls.add_many([text])
+
+    @classmethod
+    def add_many(cls, lines: List[str]) -> None:
+        """Appends a batch of lines under a single lock acquisition."""
+        if not lines:
+            return
+        with cls._lock:
+            for line in lines:
+                cls._append_locked(line)
+            evicted = cls._evict_locked()
+            spill = cls._spill
+            if evicted and spill:
+                cls._in_flight = cls._in_flight + evicted
+            wake = not cls._wake_pending
+            cls._wake_pending = True
+
+        # Disk I/O happens outside the lock — readers are never held up by it
+        if evicted and spill:
+            spill.write(evicted)
+            with cls._lock:
+                cls._in_flight = [
+                    s for s in cls._in_flight if all(s is not e for e in evicted)
+                ]
+        if wake:
+            cls._notify()
+
+    @classmethod
+    def set_live(cls, text: str, progress: Any = None) -> None:
+        """Replaces the live (unterminated) line and the current progress."""
+        with cls._lock:
+            cls._live = text
+            cls._progress = progress
+            wake = not cls._wake_pending
+            cls._wake_pending = True
 
-        # Let's limit the volume so it doesn't grow endlessly
-        if len(cls._lines) > 10000:
-            cls._lines = cls._lines[-8000:]
+        if wake:
+            cls._notify()
+
+    @classmethod
+    def live_state(cls) -> Tuple[str, Any]:
+        """Returns (live_line, progress)."""
+        with cls._lock:
+            return cls._live, cls._progress
 
     @classmethod
     def clear(cls) -> None:
-        cls._lines = []
+        with cls._lock:
+            cls._segments.clear()
+            cls._size = 0
+            cls._live = ""
+            cls._progress = None
 
     @classmethod
     def get_all(cls) -> str:
-        return "".join(cls._lines) if cls._lines else ""
+        with cls._lock:
+            return "".join("".join(seg.lines) for seg in cls._segments)
+
+    @classmethod
+    def last_seq(cls) -> int:
+        """Sequence number to pass to read_since() to get only future lines."""
+        return cls._next_seq
+
+    @classmethod
+    def snapshot(cls) -> List[List[str]]:
+        """
+        Returns the lines held in memory as a list of per-segment chunks,
+        including evicted segments whose spill write has not finished yet.
+        Closed segments are shared, not copied, so this is cheap to take;
+        they are never modified again, which makes reading them lock-free.
+        """
+        with cls._lock:
+            chunks = [seg.lines for seg in cls._in_flight]
+            chunks += [seg.lines for seg in cls._segments]
+            if chunks:
+                chunks[-1] = chunks[-1][:]  # the open segment still grows
+        return chunks
+
+    @classmethod
+    def spill_path(cls) -> str | None:
+        """Where evicted output of this session goes (None without spilling)."""
+        spill = cls._spill
+        return spill.path if spill else None
+
+    @classmethod
+    def spill_files(cls) -> List[str]:
+        """Files holding the output already evicted from memory, oldest first."""
+        spill = cls._spill
+        return spill.files() if spill else []
+
+    @classmethod
+    def read_since(cls, seq: int, limit: int | None = None) -> Tuple[List[str], int]:
+        """
+        Returns (lines, next_seq): the lines added after `seq` and the value
+        to pass on the next call. If `seq` is older than what memory holds,
+        everything still held is returned. With `limit`, only the newest
+        `limit` of those lines are.
+        """
+        chunks: List[List[str]] = []
+        with cls._lock:
+            cls._wake_pending = False
+            end = cls._next_seq
+            if limit:
+                seq = max(seq, end - limit)  # sequence numbers are contiguous
+            if seq >= end:
+                return [], end
+
+            # Walk from the newest segment — cost is O(new lines), not O(buffer)
+            for seg in reversed(cls._segments):
+                if seg.start + len(seg.lines) <= seq:
+                    break
+                offset = seq - seg.start
+                chunks.append(seg.lines[offset:] if offset > 0 else seg.lines[:])
+
+        lines: List[str] = []
+        for chunk in reversed(chunks):
+            lines.extend(chunk)
+        return lines, end
+
+    # ── Internal storage ─────────────────────────────
+    @classmethod
+    def _append_locked(cls, line: str) -> None:
+        seg = cls._segments[-1] if cls._segments else None
+        if seg is None or seg.size >= cls.SEGMENT_BYTES:
+            seg = _Segment(cls._next_seq)
+            cls._segments.append(seg)
+        seg.lines.append(line)
+        seg.size += len(line)
+        cls._size += len(line)
+        cls._next_seq += 1
+
+    @classmethod
+    def _evict_locked(cls) -> List[_Segment]:
+        evicted: List[_Segment] = []
+        # The newest (open) segment always stays in memory
+        while cls._size > cls.MAX_BYTES and len(cls._segments) > 1:
+            seg = cls._segments.popleft()
+            cls._size -= seg.size
+            evicted.append(seg)
+        return evicted
+
+    # ── Wake-up subscription ─────────────────────────
+    @classmethod
+    def subscribe(cls, callback: Callable[[], None]) -> None:
+        """Registers a callback fired (from the producer thread) when new data is pending."""
+        with cls._lock:
+            if callback not in cls._listeners:
+                cls._listeners = cls._listeners + [callback]
+
+    @classmethod
+    def unsubscribe(cls, callback: Callable[[], None]) -> None:
+        with cls._lock:
+            cls._listeners = [cb for cb in cls._listeners if cb != callback]
+
+    @classmethod
+    def _notify(cls) -> None:
+        # The list is replaced, never mutated, so iterating a snapshot is safe
+        for callback in cls._listeners:
+            try:
+                callback()
+            except Exception:
+                # A consumer that went away must not kill the reader thread
+                pass
@@ -0,0 +1,74 @@
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from utils.console_buffer import ConsoleBuffer
+
+
+class ConsoleFeed(QObject):
+    """
+    Delivers the output of a console buffer (ConsoleBuffer, or another
+    instance's, see ConsoleBuffer.create) to the Qt thread in coalesced
+    batches.
+
+    The reader thread only emits a wake-up signal (queued, non-blocking) the
+    first time data arrives after a drain. The feed then waits one frame and
+    emits everything that accumulated as a single `lines_ready` batch.
+    The live progress line and the parsed progress are reported separately,
+    only when they change. With `max_lines`, a batch holds at most the newest
+    `max_lines` lines — a view that keeps no more never renders the rest.
+    """
+
+    FRAME_MS = 50  # ~20 batches per second at most
+
+    lines_ready = pyqtSignal(list)
+    live_changed = pyqtSignal(str)
+    progress_changed = pyqtSignal(object)  # ProgressInfo | None
+    _wake = pyqtSignal()
+
+    def __init__(
+        self,
+        parent=None,
+        from_seq: int = 0,
+        max_lines: int | None = None,
+        buffer: type[ConsoleBuffer] = ConsoleBuffer,
+    ):
+        super().__init__(parent)
+        self._buffer = buffer
+        self._seq = from_seq
+        self._max_lines = max_lines
+        self._live = ""
+        self._progress = None
+
+        self._frame = QTimer(self)
+        self._frame.setSingleShot(True)
+        self._frame.setInterval(self.FRAME_MS)
+        self._frame.timeout.connect(self._flush)  # type: ignore
+
+        # Emitted from the reader thread → delivered here via a queued connection
+        self._wake.connect(self._schedule)  # type: ignore
+        self._wake_cb = self._wake.emit  # keep one identity for unsubscribe
+        self._buffer.subscribe(self._wake_cb)
+
+        # Pick up whatever was buffered before we subscribed
+        QTimer.singleShot(0, self._flush)
+
+    def stop(self):
+        """Detaches the feed from the buffer."""
+        self._buffer.unsubscribe(self._wake_cb)
+        self._frame.stop()
+
+    def _schedule(self):
+        if not self._frame.isActive():
+            self._frame.start()
+
+    def _flush(self):
+        lines, self._seq = self._buffer.read_since(self._seq, self._max_lines)
+        if lines:
+            self.lines_ready.emit(lines)  # type: ignore
+
+        live, progress = self._buffer.live_state()
+        if live != self._live:
+            self._live = live
+            self.live_changed.emit(live)  # type: ignore
+        if progress != self._progress:
+            self._progress = progress
+            self.progress_changed.emit(progress)  # type: ignore
@@ -0,0 +1,74 @@
+import re
+from typing import Iterable, Iterator
+
+from utils.console_buffer import ConsoleBuffer
+
+# ── Precompiled filters ───────────────────────────
+FILTERS = {
+    "warnings": re.compile(r"\bwarn(?:ing)?s?\b", re.IGNORECASE),
+    "errors": re.compile(
+        r"\b(?:error|exception|failed|critical|fatal)\b", re.IGNORECASE
+    ),
+    "prompts": re.compile(r"Prompt executed in"),
+}
+TRACEBACK_START = "Traceback (most recent call last):"
+
+
+def compile_query(query: str) -> re.Pattern:
+    """Compiles a user query as a case-insensitive regex, or literally if invalid."""
+    try:
+        return re.compile(query, re.IGNORECASE)
+    except re.error:
+        return re.compile(re.escape(query), re.IGNORECASE)
+
+
+def iter_history(buffer: type[ConsoleBuffer] = ConsoleBuffer) -> Iterator[str]:
+    """
+    All output of one console buffer in this session, oldest first: the
+    spilled session files, then what is still in memory.
+    """
+    # Memory is captured first. The snapshot also holds evicted segments
+    # that are still being written to the spill, so a segment is always in
+    # the snapshot or in a spill file: at worst twice, never missing.
+    chunks = buffer.snapshot()
+    for path in buffer.spill_files():
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                yield from f
+        except OSError:
+            continue
+    for chunk in chunks:
+        yield from chunk
+
+
+def _iter_tracebacks(lines: Iterable[str]) -> Iterator[str]:
+    """Yields whole traceback blocks: header, indented frames, exception line."""
+    inside = False
+    for line in lines:
+        if line.startswith(TRACEBACK_START):
+            inside = True
+            yield line
+        elif inside:
+            yield line
+            # the first non-indented line is the exception itself
+            if line[:1] not in (" ", "\t") and line.strip():
+                inside = False
+
+
+def iter_matches(
+    query: str = "", preset: str | None = None, lines: Iterable[str] | None = None
+) -> Iterator[str]:
+    """Yields history lines that pass the preset filter and the query."""
+    source: Iterable[str] = iter_history() if lines is None else lines
+
+    if preset == "tracebacks":
+        source = _iter_tracebacks(source)
+    elif preset:
+        preset_re = FILTERS[preset]
+        source = (line for line in source if preset_re.search(line))
+
+    if query:
+        query_re = compile_query(query)
+        source = (line for line in source if query_re.search(line))
+
+    return iter(source)
@@ -0,0 +1,158 @@
+import codecs
+import re
+from dataclasses import dataclass
+from typing import Callable, List
+
+from utils.console_buffer import ConsoleBuffer
+
+# tqdm bar: " 45%|████▌     | 9/20 [00:03<00:04,  2.61it/s]" (or "1.52s/it")
+_TQDM_RE = re.compile(
+    r"(?P<percent>\d+)%\|[^|]*\|\s*(?P<step>\d+)/(?P<total>\d+)"
+    r"(?:\s*\[[^\]]*?(?P<rate>[\d.]+)\s*(?P<unit>it/s|s/it))?"
+)
+
+
+@dataclass(frozen=True)
+class ProgressInfo:
+    step: int
+    total: int
+    percent: int
+    it_per_sec: float | None = None
+
+    @property
+    def done(self) -> bool:
+        return self.total > 0 and self.step >= self.total
+
+
+def parse_progress(text: str) -> ProgressInfo | None:
+    """Extracts tqdm progress from a console line, if it has one."""
+    if "%|" not in text:
+        return None
+    m = _TQDM_RE.search(text)
+    if not m:
+        return None
+
+    rate = None
+    if m.group("rate"):
+        try:
+            value = float(m.group("rate"))
+            if m.group("unit") == "s/it":
+                value = 1.0 / value if value > 0 else None
+            rate = value
+        except ValueError:
+            rate = None
+
+    return ProgressInfo(
+        step=int(m.group("step")),
+        total=int(m.group("total")),
+        percent=int(m.group("percent")),
+        it_per_sec=rate,
+    )
+
+
+def _collapse_cr(segment: str) -> str:
+    """Keeps only the last carriage-return rewrite of a line (tqdm style)."""
+    if "\r" not in segment:
+        return segment
+    for part in reversed(segment.split("\r")):
+        if part:
+            return part
+    return ""
+
+
+class StreamLineSplitter:
+    """
+    Turns raw stdout chunks into complete text lines.
+
+    Bytes are decoded incrementally (a UTF-8 sequence may be cut between
+    chunks, invalid bytes are replaced), lines are split in bulk, and bare
+    '\\r' rewrites are collapsed so only the final state of a line is kept.
+    """
+
+    def __init__(self, encoding: str = "utf-8"):
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        self._pending = ""  # unterminated tail of the stream
+
+    @property
+    def pending(self) -> str:
+        """The current unterminated line (already collapsed)."""
+        return _collapse_cr(self._pending)
+
+    def feed(self, data: bytes) -> List[str]:
+        """Consumes a chunk, returns the lines it completed (with '\\n')."""
+        text = self._pending + self._decoder.decode(data)
+        if "\n" not in text:
+            self._pending = self._compact(text)
+            return []
+
+        parts = text.replace("\r\n", "\n").split("\n")
+        self._pending = self._compact(parts.pop())
+        return [_collapse_cr(p) + "\n" for p in parts]
+
+    def flush(self) -> List[str]:
+        """Returns whatever is left once the stream is closed."""
+        tail = _collapse_cr(self._pending + self._decoder.decode(b"", final=True))
+        self._pending = ""
+        return [tail + "\n"] if tail else []
+
+    @staticmethod
+    def _compact(tail: str) -> str:
+        # Keep the pending tail small while a progress bar keeps rewriting it.
+        # A trailing '\r' is preserved: it may be the first half of '\r\n'.
+        if tail.endswith("\r"):
+            return _collapse_cr(tail[:-1]) + "\r"
+        return _collapse_cr(tail)
+
+
+class ConsolePipeline:
+    """
+    Stage between the stdout reader and ConsoleBuffer.
+
+    Complete lines are committed to the buffer; the unterminated line that a
+    progress bar keeps rewriting with '\r' is published as the buffer's live
+    line and updated in place, together with the parsed progress.
+    """
+
+    def __init__(
+        self,
+        encoding: str = "utf-8",
+        on_lines: Callable[[List[str]], None] | None = None,
+        buffer: type[ConsoleBuffer] = ConsoleBuffer,
+    ):
+        self._splitter = StreamLineSplitter(encoding)
+        self._on_lines = on_lines  # also sees every committed batch
+        self._buffer = buffer
+        self._live = ""
+        self._progress: ProgressInfo | None = None
+
+    def feed(self, data: bytes) -> None:
+        self._publish(self._splitter.feed(data), self._splitter.pending)
+
+    def close(self) -> None:
+        self._publish(self._splitter.flush(), "")
+
+    def _publish(self, lines: List[str], live: str) -> None:
+        progress = self._progress
+        for line in lines:
+            progress = self._next_progress(progress, line)
+        if live:
+            progress = parse_progress(live) or progress
+
+        if lines:
+            self._buffer.add_many(lines)
+            if self._on_lines:
+                self._on_lines(lines)
+        if live != self._live or progress != self._progress:
+            self._buffer.set_live(live, progress)
+        self._live = live
+        self._progress = progress
+
+    @staticmethod
+    def _next_progress(current: ProgressInfo | None, line: str):
+        parsed = parse_progress(line)
+        if parsed:
+            return parsed
+        # A finished bar stays visible until ordinary output follows it
+        if current and current.done:
+            return None
+        return current
@@ -0,0 +1,191 @@
+import os
+import shutil
+import subprocess
+import threading
+import time
+from dataclasses import dataclass, replace
+from subprocess import TimeoutExpired
+
+from utils.logger import log_event
+from utils.state_store import StateStore
+
+
+@dataclass(frozen=True)
+class GpuDevice:
+    name: str
+    memory_mb: int
+
+
+@dataclass(frozen=True)
+class CudaInfo:
+    available: bool
+    devices: tuple[GpuDevice, ...] = ()
+    tool: str | None = None  # the nvidia-smi that answered
+    source: str = "probe"  # probe | memory | state | none
+
+
+class CudaProbe:
+    """
+    Answers "is there a usable NVIDIA GPU?" without running nvidia-smi on
+    every launch. A probe result is cached in memory and in the state store,
+    keyed by the nvidia-smi path and mtime (a driver update replaces the
+    tool) and trusted for TTL_S. A negative answer may be transient (driver
+    mid-update, busy GPU): it is kept in memory only, for NEGATIVE_TTL_S.
+    prefetch() runs the probe in the background at start-up, so a launch
+    normally finds the answer ready.
+    """
+
+    TTL_S = 12 * 3600
+    NEGATIVE_TTL_S = 60
+    TIMEOUT_S = 5
+    STATE_KEY = "cuda_probe"
+
+    _probe_lock = threading.Lock()  # held for the whole probe: one nvidia-smi at a time
+    _lock = threading.Lock()  # guards the two below, never held across the probe
+    _cached: tuple[tuple, float, CudaInfo] | None = None  # (key, checked, info)
+    _generation = 0  # bumped by invalidate(); a probe started before is not cached
+
+    @classmethod
+    def get(cls) -> CudaInfo:
+        """The cached answer if still valid; otherwise probes (or waits for prefetch)."""
+        tool = shutil.which("nvidia-smi")
+        if not tool:
+            return CudaInfo(False, source="none")
+        key = cls._tool_key(tool)
+
+        info = cls._from_memory(key)
+        if info is not None:
+            return info
+
+        with cls._probe_lock:
+            info = cls._from_memory(key)  # probed while we waited
+            if info is not None:
+                return info
+            with cls._lock:
+                generation = cls._generation
+
+            stored = cls._from_state(key)
+            if stored is not None:
+                cls._remember(generation, (key, stored[0], stored[1]))
+                return stored[1]
+
+            info, persist = cls._probe(tool)
+            current = cls._remember(generation, (key, time.time(), info))
+            if current and persist and info.available:
+                cls._to_state(key, info)
+            return info
+
+    @classmethod
+    def prefetch(cls):
+        """Starts the probe in the background (a no-op if the answer is cached)."""
+        threading.Thread(target=cls.get, name="cuda-probe", daemon=True).start()
+
+    @classmethod
+    def invalidate(cls, negative_only: bool = False):
+        """
+        Forgets the answer (only a "no CUDA" one with negative_only). Never
+        waits for a running probe; its result is then returned to its caller
+        but not cached.
+        """
+        with cls._lock:
+            if negative_only and cls._cached and cls._cached[2].available:
+                return
+            cls._cached = None
+            cls._generation += 1
+        if not negative_only:
+            StateStore.delete(cls.STATE_KEY)
+
+    # ── Internals ─────────────────────────────────
+    @classmethod
+    def _from_memory(cls, key: tuple) -> CudaInfo | None:
+        with cls._lock:
+            if cls._cached is None:
+                return None
+            cached_key, checked, info = cls._cached
+        if cached_key == key and time.time() - checked < cls._ttl(info):
+            return replace(info, source="memory")
+        return None
+
+    @classmethod
+    def _remember(cls, generation: int, entry: tuple) -> bool:
+        """Caches the entry unless invalidate() ran since `generation`."""
+        with cls._lock:
+            if generation != cls._generation:
+                return False
+            cls._cached = entry
+            return True
+
+    @classmethod
+    def _ttl(cls, info: CudaInfo) -> float:
+        return cls.TTL_S if info.available else cls.NEGATIVE_TTL_S
+
+    @staticmethod
+    def _tool_key(tool: str) -> tuple:
+        try:
+            mtime = os.stat(tool).st_mtime_ns
+        except OSError:
+            mtime = 0
+        return os.path.normcase(os.path.abspath(tool)), mtime
+
+    @classmethod
+    def _probe(cls, tool: str) -> tuple[CudaInfo, bool]:
+        """Runs nvidia-smi: (info, worth persisting). Timeouts are not persisted."""
+        try:
+            result = subprocess.run(
+                [
+                    tool,
+                    "--query-gpu=name,memory.total",
+                    "--format=csv,noheader,nounits",
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                timeout=cls.TIMEOUT_S,  # таймаут на случай зависания
+            )
+            if result.returncode != 0:
+                # very old drivers know no --query-gpu: plain call decides
+                result = subprocess.run(
+                    [tool],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    timeout=cls.TIMEOUT_S,
+                )
+                return CudaInfo(result.returncode == 0, (), tool), True
+        except TimeoutExpired:
+            log_event("⚠️ nvidia-smi timed out — assuming no CUDA for now.")
+            return CudaInfo(False, (), tool), False
+        except OSError:
+            return CudaInfo(False, (), tool), False
+
+        devices = []
+        for line in result.stdout.decode("utf-8", errors="replace").splitlines():
+            name, _, memory = line.rpartition(",")
+            try:
+                devices.append(GpuDevice(name.strip(), int(float(memory))))
+            except ValueError:
+                continue
+        return CudaInfo(True, tuple(devices), tool), True
+
+    @classmethod
+    def _from_state(cls, key: tuple) -> tuple[float, CudaInfo] | None:
+        data = StateStore.get(cls.STATE_KEY)
+        if not isinstance(data, dict) or tuple(data.get("key") or ()) != key:
+            return None
+        if not data.get("available"):
+            return None  # negatives are not trusted across launches
+        checked = float(data.get("checked") or 0)
+        if time.time() - checked >= cls.TTL_S:
+            return None
+        devices = tuple(GpuDevice(n, int(m)) for n, m in data.get("devices") or [])
+        return checked, CudaInfo(bool(data.get("available")), devices, key[0], "state")
+
+    @classmethod
+    def _to_state(cls, key: tuple, info: CudaInfo):
+        StateStore.set(
+            cls.STATE_KEY,
+            {
+                "key": list(key),
+                "checked": time.time(),
+                "available": info.available,
+                "devices": [[d.name, d.memory_mb] for d in info.devices],
+            },
+        )
@@ -0,0 +1,35 @@
+import os
+import time
+
+REPLACE_ATTEMPTS = 5
+
+
+def atomic_write(path: str, data: bytes | str):
+    """
+    Writes a temp file next to `path` and renames it over the original, so
+    readers see either the old or the new file, never a half-written one.
+    Text is written as UTF-8, bytes as they are.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        for attempt in range(REPLACE_ATTEMPTS):
+            try:
+                os.replace(tmp, path)
+                return
+            except PermissionError:
+                # Windows refuses while another process (AV, indexer, editor) has it open
+                if attempt == REPLACE_ATTEMPTS - 1:
+                    raise
+                time.sleep(0.05 * (attempt + 1))
+    finally:
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
@@ -0,0 +1,139 @@
+import itertools
+import socket
+import subprocess
+import threading
+from typing import Iterable
+
+from config import COMFYUI_PORT, INSTANCE_PORT_SPAN
+from utils.console_buffer import ConsoleBuffer
+from utils.process_supervisor import ProcessSupervisor
+from utils.readiness import ServerReadiness, is_port_open
+
+DEFAULT_INSTANCE = "main"
+
+# starting → running → stopping → stopped (a crash also ends in "stopped")
+INSTANCE_STATES = ("starting", "running", "stopping", "stopped")
+
+
+class ComfyInstance:
+    """
+    One ComfyUI server run by the launcher: its port, build, process tree,
+    readiness tracker and console. The main instance (the one the browser
+    window shows) writes to ConsoleBuffer itself; others get their own.
+    """
+
+    def __init__(self, instance_id: str, port: int, build_id: str = ""):
+        self.id = instance_id
+        self.port = port
+        self.build_id = build_id
+        self.comfy_path = ""
+        self.mode = ""
+        self.state = "stopped"
+        self.process: subprocess.Popen | None = None
+        self.supervisor = ProcessSupervisor()
+        self.readiness = ServerReadiness()
+        self.console: type[ConsoleBuffer] = (
+            ConsoleBuffer
+            if instance_id == DEFAULT_INSTANCE
+            else ConsoleBuffer.create(instance_id)
+        )
+
+    @property
+    def pid(self) -> int | None:
+        return self.supervisor.pid
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def status(self) -> dict:
+        return {
+            "id": self.id,
+            "state": self.state,
+            "port": self.port,
+            "pid": self.pid,
+            "build_id": self.build_id,
+            "mode": self.mode,
+        }
+
+
+class InstanceRegistry:
+    """
+    The server instances of this launcher, keyed by instance id. Ports are
+    handed out here, so two instances never get the same one.
+    """
+
+    _lock = threading.Lock()
+    _instances: dict[str, ComfyInstance] = {}
+    _counter = itertools.count(2)
+
+    @classmethod
+    def get(cls, instance_id: str) -> ComfyInstance | None:
+        with cls._lock:
+            return cls._instances.get(instance_id)
+
+    @classmethod
+    def get_or_create(
+        cls, instance_id: str, port: int | None = None, build_id: str = ""
+    ) -> ComfyInstance:
+        """
+        The instance with this id. A new one gets `port`, or COMFYUI_PORT for
+        the main instance, or the next free port above it for any other.
+        """
+        with cls._lock:
+            instance = cls._instances.get(instance_id)
+            if instance is None:
+                if port is None:
+                    port = (
+                        COMFYUI_PORT
+                        if instance_id == DEFAULT_INSTANCE
+                        else cls._allocate_port_locked()
+                    )
+                instance = ComfyInstance(instance_id, port, build_id)
+                cls._instances[instance_id] = instance
+            elif build_id:
+                instance.build_id = build_id
+            return instance
+
+    @classmethod
+    def new_id(cls, taken: Iterable[str] = ()) -> str:
+        """A fresh id, also unused by `taken` (e.g. ids of recorded sessions)."""
+        taken = set(taken)
+        with cls._lock:
+            while True:
+                instance_id = f"instance-{next(cls._counter)}"
+                if instance_id not in cls._instances and instance_id not in taken:
+                    return instance_id
+
+    @classmethod
+    def all(cls) -> list[ComfyInstance]:
+        with cls._lock:
+            return list(cls._instances.values())
+
+    @classmethod
+    def remove(cls, instance_id: str):
+        with cls._lock:
+            cls._instances.pop(instance_id, None)
+
+    @classmethod
+    def _allocate_port_locked(cls) -> int:
+        taken = {i.port for i in cls._instances.values()}
+        for port in range(COMFYUI_PORT + 1, COMFYUI_PORT + INSTANCE_PORT_SPAN):
+            if port not in taken and port_is_free(port):
+                return port
+        raise RuntimeError(
+            f"No free port in {COMFYUI_PORT + 1}-"
+            f"{COMFYUI_PORT + INSTANCE_PORT_SPAN - 1} for another ComfyUI instance"
+        )
+
+
+def port_is_free(port: int) -> bool:
+    """Nothing listens on the port and it can be bound on localhost."""
+    if is_port_open(port):
+        return False
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind(("127.0.0.1", port))
+        except OSError:
+            return False
+    return True
@@ -0,0 +1,93 @@
+import os
+
+
+class LogTailReader:
+    """
+    Reads a growing text log from the end, one page at a time.
+
+    Only byte offsets are remembered: the tail is read by seeking from the
+    end, older pages are read backwards on demand, and appended output is
+    picked up from the last offset — the file is never read as a whole.
+    Page boundaries are moved to line breaks, so a UTF-8 sequence is never
+    split between two reads.
+    """
+
+    def __init__(self, path: str, page_bytes: int = 64 * 1024):
+        self.path = path
+        self.page_bytes = page_bytes
+        self._start = 0  # offset of the oldest loaded byte
+        self._end = 0  # offset right after the newest loaded line
+        self._file_id = None
+
+    @property
+    def has_older(self) -> bool:
+        return self._start > 0
+
+    def read_tail(self) -> str:
+        """(Re)starts from the last page of the file."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._start = self._end = 0
+            self._file_id = None
+            return ""
+
+        self._file_id = (st.st_ino, st.st_dev)
+        start = max(0, st.st_size - self.page_bytes)
+        data = self._read(start, st.st_size)
+        if start > 0:
+            # drop the partial line the page starts in
+            cut = data.find(b"\n") + 1
+            start += cut
+            data = data[cut:]
+        end = start + data.rfind(b"\n") + 1 if b"\n" in data else start
+        self._start, self._end = start, end
+        return self._decode(data[: end - start])
+
+    def read_older(self) -> str:
+        """Returns the page before the oldest loaded one ('' at the file start)."""
+        if self._start <= 0:
+            return ""
+        start = max(0, self._start - self.page_bytes)
+        data = self._read(start, self._start)
+        if start > 0:
+            cut = data.find(b"\n") + 1
+            if cut == 0:
+                # a single line longer than a page — take it whole next time
+                self.page_bytes *= 2
+                return self.read_older()
+            start += cut
+            data = data[cut:]
+        self._start = start
+        return self._decode(data)
+
+    def read_new(self) -> str | None:
+        """
+        Returns complete lines appended since the last read, or None if the
+        file was truncated or rotated and the view has to restart from read_tail().
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        if (st.st_ino, st.st_dev) != self._file_id or st.st_size < self._end:
+            return None
+        if st.st_size == self._end:
+            return ""
+
+        data = self._read(self._end, st.st_size)
+        complete = data.rfind(b"\n") + 1  # leave a half-written line for later
+        self._end += complete
+        return self._decode(data[:complete])
+
+    def _read(self, start: int, end: int) -> bytes:
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(start)
+                return f.read(end - start)
+        except OSError:
+            return b""
+
+    @staticmethod
+    def _decode(data: bytes) -> str:
+        return data.decode("utf-8", errors="replace")
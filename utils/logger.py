@@ -1,5 +1,14 @@
+import atexit
+import gzip
+import json
 import os
-from datetime import datetime
+import queue
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
 
 def _get_log_dir():
@@ -12,15 +21,385 @@ def _get_log_dir():
 
 LOG_DIR = _get_log_dir()
 LOG_FILE = os.path.join(LOG_DIR, "launcher.log")
+EVENTS_FILE = os.path.join(LOG_DIR, "events.jsonl")
+
+# ── Background writer ─────────────────────────────
+# log_event() only formats the line and puts it on a queue; a single daemon
+# thread owns the open log file, writes whatever has accumulated in one go
+# and flushes once per batch.
+_BATCH_MAX = 1000
+_STOP = object()
+
+_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+_file_lock = threading.Lock()  # guards both log files
+_writer: threading.Thread | None = None
+_writer_lock = threading.Lock()
+_closed = False
+
+# ── Rotation ──────────────────────────────────────
+# launcher.log and events.jsonl each roll over to <file>.1 (newest) … <file>.N
+# once they exceed the size limit or their first entry is older than the
+# age limit. One policy covers both.
+_rotation = {
+    "max_bytes": 5 * 1024 * 1024,
+    "max_age_days": 30,
+    "keep": 5,
+    "compress": True,
+}
 
 
 def log_event(message: str):
-    """Writes an event to the console and log file."""
+    """Writes an event to the console and log file (without blocking on disk)."""
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     formatted = f"[{timestamp}] {message}"
-    print(formatted)
+    if _closed or not _ensure_writer():
+        # Synchronous fallback: interpreter shutting down or no writer thread
+        print(formatted)
+        _write_lines([formatted + "\n"])
+        return
+    _queue.put(formatted)
+
+
+def log_structured(
+    event: str, outcome: str = "ok", duration_ms: float | None = None, **fields
+):
+    """
+    Appends one machine-readable record to events.jsonl (through the same
+    background writer). `mono` is time.monotonic(), so durations and gaps
+    between records of one session can be computed exactly.
+    """
+    record = {
+        "ts": datetime.now().isoformat(timespec="milliseconds"),
+        "mono": round(time.monotonic(), 4),
+        "event": event,
+        "pid": os.getpid(),
+        "outcome": outcome,
+    }
+    if duration_ms is not None:
+        record["duration_ms"] = round(duration_ms, 1)
+    record.update(fields)
+    line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+
+    if _closed or not _ensure_writer():
+        _write_events([line])
+        return
+    _queue.put(_EventRecord(line))
+
+
+@contextmanager
+def timed_event(event: str, **fields):
+    """
+    Times a block and logs it as one structured event. The yielded dict can
+    be filled in by the block (outcome, ids, per-phase timings); an exception
+    is recorded as outcome "error" and re-raised.
+
+        with timed_event("comfy.stop") as ev:
+            ...
+            ev["outcome"] = "stopped"
+    """
+    info = {"outcome": "ok", **fields}
+    start = time.monotonic()
     try:
-        with open(LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(formatted + "\n")
-    except Exception as e:
-        print(f"[LOGGER ERROR] {e}")
+        yield info
+    except BaseException as e:
+        info["outcome"] = "error"
+        info["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        outcome = info.pop("outcome")
+        log_structured(event, outcome, (time.monotonic() - start) * 1000, **info)
+
+
+def phase_ms(start: float) -> float:
+    """Milliseconds since `start` (a time.monotonic() value), for phase timings."""
+    return round((time.monotonic() - start) * 1000, 1)
+
+
+def flush_logs(timeout: float = 2.0) -> bool:
+    """Blocks until everything logged so far is on disk (or the timeout expires)."""
+    writer = _writer
+    if writer is None or not writer.is_alive():
+        return True
+    done = threading.Event()
+    _queue.put(done)
+    return done.wait(timeout)
+
+
+def clear_log():
+    """Truncates the log file, coordinated with the writer's open handle."""
+    flush_logs()
+    with _file_lock:
+        _log_file.close()
+        open(LOG_FILE, "w", encoding="utf-8").close()
+        _log_file.size = 0
+        _log_file.segment_start = None
+
+
+def shutdown_logger(timeout: float = 2.0):
+    """Drains the queue and closes the file; later calls write synchronously."""
+    global _closed
+    _closed = True  # from here on log_event() writes synchronously
+    writer = _writer
+    if writer is not None and writer.is_alive():
+        _queue.put(_STOP)
+        writer.join(timeout)
+
+    # Anything the writer did not get to is written here
+    leftover = []
+    records = []
+    try:
+        while True:
+            item = _queue.get_nowait()
+            if isinstance(item, _EventRecord):
+                records.append(item)
+            elif isinstance(item, str):
+                leftover.append(item + "\n")
+    except queue.Empty:
+        pass
+    if leftover:
+        _write_lines(leftover)
+    if records:
+        _write_events(records)
+
+    with _file_lock:
+        _log_file.close()
+        _events_file.close()
+
+
+def configure_rotation(
+    max_bytes: int | None = None,
+    max_age_days: float | None = None,
+    keep: int | None = None,
+    compress: bool | None = None,
+):
+    """Updates the rotation policy; 0 disables the size or age limit."""
+    with _file_lock:
+        if max_bytes is not None:
+            _rotation["max_bytes"] = max(0, int(max_bytes))
+        if max_age_days is not None:
+            _rotation["max_age_days"] = max(0.0, float(max_age_days))
+        if keep is not None:
+            _rotation["keep"] = max(1, int(keep))
+        if compress is not None:
+            _rotation["compress"] = bool(compress)
+
+
+def install_excepthook():
+    """Logs uncaught exceptions synchronously, after draining pending lines."""
+    previous_hook = sys.excepthook
+    previous_thread_hook = threading.excepthook
+
+    def _log_crash(exc_type, exc, tb, where: str):
+        flush_logs(1.0)
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        details = "".join(traceback.format_exception(exc_type, exc, tb))
+        _write_lines([f"[{timestamp}] ❌ Unhandled exception{where}:\n{details}"])
+
+    def hook(exc_type, exc, tb):
+        _log_crash(exc_type, exc, tb, "")
+        previous_hook(exc_type, exc, tb)
+
+    def thread_hook(args):
+        if args.exc_type is not SystemExit:
+            name = args.thread.name if args.thread else "?"
+            _log_crash(args.exc_type, args.exc_value, args.exc_traceback, f" in {name}")
+        previous_thread_hook(args)
+
+    sys.excepthook = hook
+    threading.excepthook = thread_hook
+
+
+# ── Internals ─────────────────────────────────────
+class _EventRecord(str):
+    """A queued events.jsonl line (plain str items go to launcher.log)."""
+
+
+def _ensure_writer() -> bool:
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return True
+    with _writer_lock:
+        if _writer is not None and _writer.is_alive():
+            return True
+        try:
+            _writer = threading.Thread(
+                target=_writer_loop, name="launcher-log-writer", daemon=True
+            )
+            _writer.start()
+            return True
+        except RuntimeError:
+            _writer = None
+            return False
+
+
+def _writer_loop():
+    while True:
+        batch = [_queue.get()]
+        try:
+            while len(batch) < _BATCH_MAX:
+                batch.append(_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        lines = []
+        records = []
+        events = []
+        stop = False
+        for item in batch:
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, threading.Event):
+                events.append(item)
+            elif isinstance(item, _EventRecord):
+                records.append(item)
+            else:
+                lines.append(item)
+
+        if lines:
+            print("\n".join(lines))
+            _write_lines([line + "\n" for line in lines])
+        if records:
+            _write_events(records)
+        for event in events:
+            event.set()
+        if stop:
+            return
+
+
+def _write_lines(lines):
+    with _file_lock:
+        _log_file.write("".join(lines))
+
+
+def _write_events(lines):
+    with _file_lock:
+        _events_file.write("".join(lines))
+
+
+class _LogFile:
+    """
+    One append-only log file: its open handle and rotation state. Every
+    method is called with _file_lock held, so the writer never writes into
+    a file that is being renamed.
+    """
+
+    def __init__(self, path: str, read_start):
+        self.path = path
+        self._read_start = read_start  # dates the first entry of the file
+        self.handle = None
+        self.size = 0
+        self.segment_start: datetime | None = None
+        # monotonic time before which a failed rotation is not retried
+        self.retry_at = 0.0
+
+    def write(self, text: str):
+        try:
+            if self.handle is None:
+                self.open()
+            elif self.needs_rotation():
+                self.rotate()
+                self.open()
+            self.handle.write(text)
+            self.handle.flush()
+            self.size = self.handle.tell()
+            if self.segment_start is None:
+                self.segment_start = datetime.now()
+        except Exception as e:
+            print(f"[LOGGER ERROR] {e}")
+            self.close()
+
+    def open(self):
+        """Opens the file for appending (rotating it first if it is due)."""
+        self.segment_start = self._read_start(self.path)
+        try:
+            self.size = os.path.getsize(self.path)
+        except OSError:
+            self.size = 0
+        if self.needs_rotation():
+            self.rotate()
+        self.handle = open(self.path, "a", encoding="utf-8")
+        self.size = self.handle.tell()
+
+    def needs_rotation(self) -> bool:
+        if self.size <= 0 or time.monotonic() < self.retry_at:
+            return False
+        max_bytes = _rotation["max_bytes"]
+        if max_bytes and self.size >= max_bytes:
+            return True
+        max_age = _rotation["max_age_days"]
+        if max_age and self.segment_start is not None:
+            return datetime.now() - self.segment_start >= timedelta(days=max_age)
+        return False
+
+    def rotate(self):
+        """
+        Shifts <file> → .1 → .2 …, dropping the oldest. If another process
+        keeps the file open (Windows refuses the rename), rotation is retried
+        on a later write.
+        """
+        self.close()
+        keep = _rotation["keep"]
+        try:
+            for suffix in ("", ".gz"):
+                oldest = f"{self.path}.{keep}{suffix}"
+                if os.path.exists(oldest):
+                    os.remove(oldest)
+            for i in range(keep - 1, 0, -1):
+                for suffix in ("", ".gz"):
+                    src = f"{self.path}.{i}{suffix}"
+                    if os.path.exists(src):
+                        os.replace(src, f"{self.path}.{i + 1}{suffix}")
+            os.replace(self.path, f"{self.path}.1")
+        except OSError as e:
+            print(f"[LOGGER ERROR] rotation skipped: {e}")
+            self.retry_at = time.monotonic() + 60  # not on every single batch
+            return
+
+        if _rotation["compress"]:
+            _compress(f"{self.path}.1")
+        self.size = 0
+        self.segment_start = None
+
+    def close(self):
+        if self.handle is not None:
+            try:
+                self.handle.close()
+            except Exception:
+                pass
+            self.handle = None
+
+
+def _read_log_start(path: str) -> datetime | None:
+    # Every line starts with "[YYYY-mm-dd HH:MM:SS]", so the first one dates the file
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            head = f.read(21)
+        return datetime.strptime(head[1:20], "%Y-%m-%d %H:%M:%S")
+    except (OSError, ValueError):
+        return None
+
+
+def _read_events_start(path: str) -> datetime | None:
+    # Every record carries its "ts", so the first one dates the file
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            first = json.loads(f.readline())
+        return datetime.fromisoformat(first["ts"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def _compress(path: str):
+    try:
+        with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+            while chunk := src.read(1024 * 1024):
+                dst.write(chunk)
+        os.remove(path)
+    except OSError as e:
+        print(f"[LOGGER ERROR] failed to compress {path}: {e}")
+
+
+_log_file = _LogFile(LOG_FILE, _read_log_start)
+_events_file = _LogFile(EVENTS_FILE, _read_events_start)
+
+atexit.register(shutdown_logger)
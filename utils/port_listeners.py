@@ -0,0 +1,60 @@
+import threading
+import time
+from typing import Iterable
+
+import psutil
+
+
+class PortListeners:
+    """
+    Finds the PIDs listening on a port. The system-wide socket table is
+    read with a single psutil.net_connections("tcp") call (per-process
+    queries dump the same table on Windows, once per PID) and reused for
+    TTL_S, so the stop loop and lookups for several ports share one dump.
+    Among the listeners, the previous answer and the caller's candidates
+    (normally the supervised ComfyUI tree) are preferred; if none of them
+    listens, every listener on the port is returned.
+    """
+
+    TTL_S = 1.0
+
+    _lock = threading.Lock()
+    _checked = 0.0  # monotonic time of the last table read
+    _table: dict[int, frozenset[int]] = {}  # port → listening pids
+    _last: dict[int, frozenset[int]] = {}  # port → previous answer
+
+    @classmethod
+    def find(cls, port: int, candidates: Iterable[int] = ()) -> set[int]:
+        with cls._lock:
+            if time.monotonic() - cls._checked >= cls.TTL_S:
+                cls._table = _listeners()
+                cls._checked = time.monotonic()
+            listeners = cls._table.get(port, frozenset())
+            known = cls._last.get(port, frozenset()) | set(candidates)
+
+        # A cached row may outlive its process by up to TTL_S
+        listeners = {pid for pid in listeners if psutil.pid_exists(pid)}
+        pids = (listeners & known) or listeners
+        with cls._lock:
+            cls._last[port] = frozenset(pids)
+        return pids
+
+    @classmethod
+    def invalidate(cls, port: int | None = None):
+        with cls._lock:
+            cls._checked = 0.0
+            if port is None:
+                cls._last.clear()
+            else:
+                cls._last.pop(port, None)
+
+
+def _listeners() -> dict[int, frozenset[int]]:
+    table: dict[int, set[int]] = {}
+    try:
+        for c in psutil.net_connections(kind="tcp"):
+            if c.laddr and c.status == psutil.CONN_LISTEN and c.pid:
+                table.setdefault(c.laddr.port, set()).add(c.pid)
+    except Exception:
+        pass
+    return {port: frozenset(pids) for port, pids in table.items()}
@@ -0,0 +1,317 @@
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+
+import psutil
+
+from utils import comfy_api
+from utils.comfy_session import same_process
+from utils.logger import log_event, phase_ms
+
+
+@dataclass(frozen=True)
+class StopPolicy:
+    """
+    How a tree is stopped. mode: "interrupt" cancels the running prompt over
+    HTTP first, "drain" lets it finish (up to drain_timeout), "kill" skips
+    straight to the hard kill. On Windows terminate() is already final, so
+    the HTTP stage is what makes the stop graceful there.
+    """
+
+    mode: str = "interrupt"
+    drain_timeout: float = 120.0
+    terminate_timeout: float = 5.0
+    kill_timeout: float = 2.0
+
+
+class ProcessSupervisor:
+    """
+    Owns the process tree of one launched ComfyUI (cmd.exe → python main.py
+    → …). On Windows the spawned process is put into a Job Object: every
+    descendant joins it automatically, so the OS keeps the member list, and
+    KILL_ON_JOB_CLOSE takes the tree down if the launcher dies. The job is
+    assigned only after Popen returns, so a child started before that is
+    outside it; descendants are therefore also collected with one walk from
+    the known members at stop time. Members are remembered by (pid, create_time), so a recycled
+    PID is never mistaken for ours. Stopping touches only this tree.
+    A tree started by an earlier launcher can be taken over with attach().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._popen: subprocess.Popen | None = None
+        self._root: int | None = None
+        self._known: dict[int, psutil.Process] = {}
+        self._job: _Job | None = None
+
+    @property
+    def tracking(self) -> bool:
+        """True while a launched tree is known (alive or not yet stopped)."""
+        return self._root is not None
+
+    @property
+    def pid(self) -> int | None:
+        return self._root
+
+    @property
+    def job_name(self) -> str | None:
+        return self._job.name if self._job else None
+
+    def track(self, popen: subprocess.Popen):
+        """Takes over a freshly spawned process (and its job, where available)."""
+        try:
+            root = psutil.Process(popen.pid)
+            procs = [root]
+            job = _Job.create(popen.pid, _job_name(popen.pid, root.create_time()))
+        except psutil.Error:
+            procs, job = [], None
+        self._start(popen.pid, procs, job)
+        self._popen = popen
+
+    def attach(self, members: list[list], job_name: str | None = None) -> bool:
+        """
+        Takes over a tree from its [[pid, create_time], …] record (the first
+        entry is the root) and reopens its job by name. Members whose PID
+        now belongs to another process are dropped; False if none is alive.
+        """
+        procs = [p for p in (same_process(pid, ct) for pid, ct in members) if p]
+        if not procs:
+            return False
+        job = _Job.open(job_name) if job_name else None
+        self._start(int(members[0][0]), procs, job)
+        return True
+
+    def keep_after_exit(self):
+        """Lets the tree outlive the launcher ("exit, keep server running")."""
+        if self._job is not None:
+            self._job.set_kill_on_close(False)
+
+    def members(self) -> list[list]:
+        """The known tree as [[pid, create_time], …], root first."""
+        with self._lock:
+            entries = []
+            for pid, proc in self._known.items():
+                try:
+                    entries.append([pid, proc.create_time()])
+                except psutil.Error:
+                    continue
+        entries.sort(key=lambda e: e[0] != self._root)
+        return entries
+
+    def running(self) -> bool:
+        """Cheap liveness check of the known members (no descendant lookup)."""
+        with self._lock:
+            procs = list(self._known.values())
+        return any(_is_live(proc) for proc in procs)
+
+    def refresh(self) -> list[psutil.Process]:
+        """
+        Adds the current descendants to the known tree; returns the live
+        members. Reads the job's member list and walks the process table
+        once from the known members (a child spawned before the job was
+        assigned is not in the job) — meant for stop time, not for polling.
+        """
+        with self._lock:
+            if self._job is not None:
+                for pid in self._job.pids():
+                    if pid not in self._known:
+                        try:
+                            self._known[pid] = psutil.Process(pid)
+                        except psutil.Error:
+                            continue
+            for proc in list(self._known.values()):
+                try:
+                    for child in proc.children(recursive=True):
+                        self._known.setdefault(child.pid, child)
+                except psutil.Error:
+                    continue
+            alive = []
+            for pid, proc in list(self._known.items()):
+                if _is_live(proc):
+                    alive.append(proc)
+                else:
+                    del self._known[pid]
+            return alive
+
+    def stop(self, policy: "StopPolicy | None" = None, port: int | None = None) -> dict:
+        """
+        Stops the tree in stages (see StopPolicy) and reports them:
+        {"found": n, "forced": n, "survivors": [pids], "stages": {name: ms}}.
+        """
+        policy = policy or StopPolicy()
+        stages: dict[str, float] = {}
+        report = {"found": 0, "forced": 0, "survivors": [], "stages": stages}
+
+        # 1️⃣ Ask ComfyUI itself: interrupt the prompt, or let it finish (drain)
+        if port is not None and policy.mode != "kill" and self._alive():
+            t0 = time.monotonic()
+            report["queue"] = _quiesce(port, policy)
+            stages["http_ms"] = phase_ms(t0)
+
+        procs = self._alive()
+        report["found"] = len(procs)
+        root = self.pid
+        # children before the parent, so nothing gets re-parented mid-way
+        procs.sort(key=lambda p: p.pid == root)
+
+        # 2️⃣ Polite terminate, 3️⃣ wait for it with a deadline
+        alive = procs
+        if policy.mode != "kill":
+            t0 = time.monotonic()
+            for proc in procs:
+                try:
+                    log_event(f"⏹ Terminating PID {proc.pid}: {proc.name()}")
+                    proc.terminate()
+                except psutil.Error:
+                    pass
+            _, alive = psutil.wait_procs(procs, timeout=policy.terminate_timeout)
+            stages["terminate_ms"] = phase_ms(t0)
+
+        # 4️⃣ Hard kill whatever is left
+        if alive:
+            t0 = time.monotonic()
+            for proc in alive:
+                try:
+                    log_event(f"💀 Killing PID {proc.pid}: {proc.name()}")
+                    proc.kill()
+                except psutil.Error:
+                    pass
+            report["forced"] = len(alive)
+            _, alive = psutil.wait_procs(alive, timeout=policy.kill_timeout)
+            stages["kill_ms"] = phase_ms(t0)
+
+        if self._popen is not None:
+            try:
+                self._popen.wait(timeout=0)  # reap, no zombie left behind
+            except subprocess.TimeoutExpired:
+                pass
+        with self._lock:
+            job, self._job = self._job, None
+            self._popen = None
+            self._root = None
+            self._known = {}
+        if job is not None:
+            job.close()
+        report["survivors"] = [p.pid for p in alive]
+        return report
+
+    def _start(self, root: int, procs: list[psutil.Process], job: "_Job | None"):
+        with self._lock:
+            old, self._job = self._job, job
+            self._popen = None
+            self._root = root
+            self._known = {p.pid: p for p in procs}
+        if old is not None:
+            old.close()
+
+    def _alive(self) -> list[psutil.Process]:
+        try:
+            return self.refresh()
+        except psutil.Error:
+            return []
+
+
+class _Job:
+    """A named Windows Job Object (pywin32); create/open give None without it."""
+
+    def __init__(self, handle, name: str):
+        self._handle = handle
+        self.name = name
+
+    @classmethod
+    def create(cls, pid: int, name: str) -> "_Job | None":
+        try:
+            import win32api
+            import win32con
+            import win32job
+        except ImportError:
+            return None
+        try:
+            job = cls(win32job.CreateJobObject(None, name), name)
+            job.set_kill_on_close(True)
+            process = win32api.OpenProcess(
+                win32con.PROCESS_SET_QUOTA | win32con.PROCESS_TERMINATE, False, pid
+            )
+            try:
+                win32job.AssignProcessToJobObject(job._handle, process)
+            finally:
+                win32api.CloseHandle(process)
+        except Exception as e:
+            log_event(f"⚠️ No job object for PID {pid}, tracking by PID: {e}")
+            return None
+        return job
+
+    @classmethod
+    def open(cls, name: str) -> "_Job | None":
+        try:
+            import win32job
+
+            return cls(
+                win32job.OpenJobObject(win32job.JOB_OBJECT_ALL_ACCESS, False, name),
+                name,
+            )
+        except Exception:
+            return None  # gone with its last process, or not on Windows
+
+    def pids(self) -> list[int]:
+        import win32job
+
+        try:
+            return list(
+                win32job.QueryInformationJobObject(
+                    self._handle, win32job.JobObjectBasicProcessIdList
+                )
+            )
+        except Exception:
+            return []
+
+    def set_kill_on_close(self, enabled: bool):
+        import win32job
+
+        info_class = win32job.JobObjectExtendedLimitInformation
+        info = win32job.QueryInformationJobObject(self._handle, info_class)
+        flags = info["BasicLimitInformation"]["LimitFlags"]
+        if enabled:
+            flags |= win32job.JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE
+        else:
+            flags &= ~win32job.JOB_OBJECT_LIMIT_KILL_ON_JOB_CLOSE
+        info["BasicLimitInformation"]["LimitFlags"] = flags
+        win32job.SetInformationJobObject(self._handle, info_class, info)
+
+    def close(self):
+        import win32api
+
+        try:
+            win32api.CloseHandle(self._handle)
+        except Exception:
+            pass
+
+
+def _job_name(pid: int, create_time: float) -> str:
+    return f"Local\\ComfyLauncher-{pid}-{int(create_time * 1000)}"
+
+
+def _is_live(proc: psutil.Process) -> bool:
+    # is_running() also compares create_time — a reused PID is not ours
+    try:
+        return proc.is_running() and proc.status() != psutil.STATUS_ZOMBIE
+    except psutil.Error:
+        return False
+
+
+def _quiesce(port: int, policy: StopPolicy) -> str:
+    """Empties ComfyUI's queue before the process is stopped; returns what happened."""
+    if not comfy_api.clear_queue(port):
+        return "unreachable"
+    if policy.mode == "drain":
+        log_event("⏳ Waiting for the running prompt to finish...")
+        deadline = time.monotonic() + policy.drain_timeout
+        while time.monotonic() < deadline:
+            state = comfy_api.queue_state(port)
+            if state is None or state[0] == 0:
+                return "drained"
+            time.sleep(0.5)
+        log_event("⚠️ Prompt still running at the drain deadline — interrupting.")
+    comfy_api.interrupt(port)
+    return "interrupted"
@@ -0,0 +1,147 @@
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Callable, Iterable
+
+# ComfyUI prints these once the HTTP server is up
+READY_MARKERS = ("To see the GUI go to", "Starting server")
+
+POLL_START_S = 0.05
+POLL_MAX_S = 1.0
+# While the console is captured, the port is tried only after this long
+# without the marker (a build that prints other startup lines)
+MARKER_GRACE_S = 2.0
+
+
+def is_port_open(port):
+    """Checks if the specified port is open"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.settimeout(0.2)
+        return s.connect_ex(("127.0.0.1", port)) == 0
+
+
+def http_probe(port: int, timeout: float = 2.0) -> bool:
+    """One HTTP request to the server; any HTTP answer (even an error) counts."""
+    request = urllib.request.Request(f"http://127.0.0.1:{port}/", method="HEAD")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout):
+            return True
+    except urllib.error.HTTPError:
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def wait_port_closed(port: int, timeout: float) -> bool:
+    """Waits (with backoff) until nothing listens on the port any more."""
+    return _poll(lambda: not is_port_open(port), timeout, lambda: False)
+
+
+class ServerReadiness:
+    """
+    Tells when a launched ComfyUI accepts requests (one object per server
+    instance). While its stdout is captured, the console reader feeds the
+    lines in and a waiter wakes up on the "server started" marker, then
+    confirms with a single HTTP probe. Without a captured console
+    (show_cmd), or once MARKER_GRACE_S passed without the marker, the port
+    is polled with exponential backoff instead.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._generation = 0  # one per launched process
+        self._captured = False
+        self._marker_seen = False
+        self._stream_open = False
+
+    def begin(self, captured: bool) -> int:
+        """Starts tracking a freshly spawned process; returns its generation."""
+        with self._cond:
+            self._generation += 1
+            self._captured = captured
+            self._stream_open = captured
+            self._marker_seen = False
+            return self._generation
+
+    def feed(self, generation: int, lines: Iterable[str]):
+        """Console lines of a process (ignored once its marker has been seen)."""
+        if self._marker_seen or generation != self._generation:
+            return
+        if any(marker in line for line in lines for marker in READY_MARKERS):
+            with self._cond:
+                if generation == self._generation:
+                    self._marker_seen = True
+                    self._cond.notify_all()
+
+    def stream_closed(self, generation: int):
+        with self._cond:
+            if generation == self._generation:
+                self._stream_open = False
+                self._cond.notify_all()
+
+    def wait(
+        self,
+        port: int,
+        timeout: float | None = None,
+        cancelled: Callable[[], bool] = lambda: False,
+    ) -> bool:
+        """
+        Blocks until the server answers (True), or the timeout expires or
+        `cancelled()` turns true (False). timeout=None waits indefinitely.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if is_port_open(port):
+            return True  # already up (or launched by someone else)
+
+        # The marker is only the fast path: after a grace period the port is
+        # tried too, with the same backoff as _poll, so a build printing
+        # other startup lines still gets ready.
+        next_probe = time.monotonic() + MARKER_GRACE_S
+        delay = POLL_START_S
+        while True:
+            with self._cond:
+                if not (self._captured and self._stream_open) or self._marker_seen:
+                    marker_seen = self._marker_seen
+                    break
+                if cancelled() or _expired(deadline):
+                    return False
+                wake = next_probe if deadline is None else min(next_probe, deadline)
+                self._cond.wait(min(0.25, max(0.0, wake - time.monotonic())))
+                if self._marker_seen:
+                    marker_seen = True
+                    break
+            if time.monotonic() >= next_probe:
+                if is_port_open(port):
+                    return True
+                next_probe = time.monotonic() + delay
+                delay = min(delay * 2, POLL_MAX_S)
+
+        if marker_seen and http_probe(port):
+            return True
+        # No console, the stream ended, or the probe came too early
+        remaining = None if deadline is None else max(0.0, _left(deadline))
+        return _poll(lambda: is_port_open(port), remaining, cancelled)
+
+
+def _poll(check, timeout: float | None, cancelled) -> bool:
+    """Calls check() at growing intervals (POLL_START_S → POLL_MAX_S)."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = POLL_START_S
+    while True:
+        if check():
+            return True
+        if cancelled() or _expired(deadline):
+            return False
+        sleep = delay if deadline is None else min(delay, _left(deadline))
+        time.sleep(max(0.0, sleep))
+        delay = min(delay * 2, POLL_MAX_S)
+
+
+def _left(deadline: float) -> float:
+    return deadline - time.monotonic()
+
+
+def _expired(deadline: float | None) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
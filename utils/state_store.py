@@ -0,0 +1,136 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils.logger import LOG_DIR, log_event
+
+STATE_PATH = os.path.join(os.path.dirname(LOG_DIR), "state.db")
+
+
+class StateStore:
+    """
+    Machine-local runtime state (patch state, update ETag, last used build)
+    kept out of user_config.json. One SQLite row per key in WAL mode, so
+    setting a key is a small append instead of a rewrite of the whole
+    preferences document. Values are stored as JSON.
+    """
+
+    _conn: sqlite3.Connection | None = None
+    _unavailable = False
+    _lock = threading.Lock()
+    _path = STATE_PATH
+
+    @classmethod
+    def get(cls, key: str, default=None):
+        with cls._lock:
+            conn = cls._connect()
+            if conn is None:
+                return default
+            try:
+                row = conn.execute(
+                    "SELECT value FROM state WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                log_event(f"⚠️ Failed to read runtime state: {e}")
+                return default
+        if row is None:
+            return default
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return default
+
+    @classmethod
+    def set(cls, key: str, value):
+        cls.set_many({key: value})
+
+    @classmethod
+    def set_many(cls, values: dict) -> bool:
+        """Writes several keys in one transaction; False if it failed."""
+        now = time.time()
+        rows = [
+            (key, json.dumps(value, ensure_ascii=False), now)
+            for key, value in values.items()
+        ]
+        with cls._lock:
+            conn = cls._connect()
+            if conn is None:
+                return False
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT INTO state (key, value, updated) VALUES (?, ?, ?) "
+                        "ON CONFLICT(key) DO UPDATE SET "
+                        "value = excluded.value, updated = excluded.updated",
+                        rows,
+                    )
+            except sqlite3.Error as e:
+                log_event(f"⚠️ Failed to save runtime state: {e}")
+                return False
+        return True
+
+    @classmethod
+    def delete(cls, key: str):
+        with cls._lock:
+            conn = cls._connect()
+            if conn is None:
+                return
+            try:
+                with conn:
+                    conn.execute("DELETE FROM state WHERE key = ?", (key,))
+            except sqlite3.Error as e:
+                log_event(f"⚠️ Failed to save runtime state: {e}")
+
+    @classmethod
+    def has(cls, key: str) -> bool:
+        return cls.get(key, _MISSING) is not _MISSING
+
+    @classmethod
+    def keys(cls, prefix: str = "") -> list[str]:
+        """Stored keys starting with `prefix`."""
+        with cls._lock:
+            conn = cls._connect()
+            if conn is None:
+                return []
+            try:
+                rows = conn.execute(
+                    "SELECT key FROM state WHERE substr(key, 1, ?) = ? ORDER BY key",
+                    (len(prefix), prefix),
+                ).fetchall()
+            except sqlite3.Error as e:
+                log_event(f"⚠️ Failed to read runtime state: {e}")
+                return []
+        return [row[0] for row in rows]
+
+    @classmethod
+    def close(cls):
+        with cls._lock:
+            if cls._conn is not None:
+                cls._conn.close()
+                cls._conn = None
+
+    @classmethod
+    def _connect(cls) -> sqlite3.Connection | None:
+        """Opens the database on first use (lock held). None if it is unusable."""
+        if cls._conn is not None or cls._unavailable:
+            return cls._conn
+        try:
+            conn = sqlite3.connect(cls._path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS state ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL)"
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            log_event(f"⚠️ Runtime state store unavailable ({cls._path}): {e}")
+            cls._unavailable = True  # run without persisted state, not retry per call
+            return None
+        cls._conn = conn
+        return conn
+
+
+_MISSING = object()
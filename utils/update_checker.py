@@ -4,7 +4,9 @@ from PyQt6.QtCore import QObject, pyqtSignal
 from packaging import version
 
 from version import __version__
-from config import load_user_config, save_user_config
+from config import config_snapshot
+from utils.logger import timed_event
+from utils.state_store import StateStore
 
 
 class UpdateService(QObject):
@@ -18,21 +20,31 @@ class UpdateService(QObject):
         self.repo_name = repo_name
 
     def check_for_updates(self):
-        config = load_user_config()
+        with timed_event(
+            "update.check",
+            current_version=__version__,
+            build_id=StateStore.get("last_used_build_id", ""),
+        ) as ev:
+            self._check_for_updates(ev)
+
+    def _check_for_updates(self, ev: dict):
+        config = config_snapshot()
 
         # 1️⃣ Проверка включена ли система обновлений
         if not config.get("updates_enabled", True):
+            ev["outcome"] = "disabled"
             self.update_not_found.emit()  # type: ignore
             return
 
         # 2️⃣ Проверка интервала
-        last_check = config.get("last_update_check")
+        last_check = StateStore.get("last_update_check")
         interval_hours = config.get("update_interval_hours", 48)
 
         if last_check:
             try:
                 last_dt = datetime.fromisoformat(last_check)
                 if datetime.utcnow() - last_dt < timedelta(hours=interval_hours):
+                    ev["outcome"] = "skipped_interval"
                     self.update_not_found.emit()  # type: ignore
                     return
             except Exception:
@@ -41,33 +53,37 @@ class UpdateService(QObject):
         try:
             # 3️⃣ Подготовка заголовков (ETag)
             headers = {}
-            if config.get("update_etag"):
-                headers["If-None-Match"] = config["update_etag"]
+            etag = StateStore.get("update_etag")
+            if etag:
+                headers["If-None-Match"] = etag
 
             url = f"https://api.github.com/repos/{self.repo_owner}/{self.repo_name}/releases/latest"
             response = requests.get(url, headers=headers, timeout=5)
+            ev["http_status"] = response.status_code
 
             # Обновляем timestamp сразу после запроса
-            config["last_update_check"] = datetime.utcnow().isoformat()
+            checked = {"last_update_check": datetime.utcnow().isoformat()}
 
             # 4️⃣ 304 — ничего не изменилось
             if response.status_code == 304:
-                save_user_config(config)
+                ev["outcome"] = "not_modified"
+                StateStore.set_many(checked)
                 self.update_not_found.emit()  # type: ignore
                 return
 
             # 5️⃣ Ошибка API
             if response.status_code != 200:
-                save_user_config(config)
+                ev["outcome"] = "http_error"
+                StateStore.set_many(checked)
                 self.error_occurred.emit(f"GitHub API error: {response.status_code}")  # type: ignore
                 return
 
             # 6️⃣ Сохраняем новый ETag
             new_etag = response.headers.get("ETag")
             if new_etag:
-                config["update_etag"] = new_etag
+                checked["update_etag"] = new_etag
 
-            save_user_config(config)
+            StateStore.set_many(checked)
 
             # 7️⃣ Обработка JSON
             data = response.json()
@@ -75,14 +91,20 @@ class UpdateService(QObject):
             release_url = data.get("html_url", "")
 
             if not latest_version:
+                ev["outcome"] = "invalid_release"
                 self.error_occurred.emit("Invalid release data")  # type: ignore
                 return
 
             # 8️⃣ Сравнение версий
+            ev["latest_version"] = latest_version
             if version.parse(latest_version) > version.parse(__version__):
+                ev["outcome"] = "update_available"
                 self.update_available.emit(latest_version, release_url)  # type: ignore
             else:
+                ev["outcome"] = "up_to_date"
                 self.update_not_found.emit()  # type: ignore
 
         except Exception as e:
+            ev["outcome"] = "error"
+            ev["error"] = str(e)
             self.error_occurred.emit(str(e))  # type: ignore
@@ -1,8 +1,8 @@
 from PyQt6.QtCore import QObject, pyqtSignal
-import time
 
-from launcher import ensure_comfyui_running, is_port_open
-from config import COMFYUI_PORT, MAX_WAIT_TIME
+from launcher import ensure_comfyui_running, wait_until_ready
+from config import MAX_WAIT_TIME
+from utils.instances import DEFAULT_INSTANCE
 
 
 class ComfyLoaderWorker(QObject):
@@ -12,10 +12,16 @@ class ComfyLoaderWorker(QObject):
     timeout = pyqtSignal()
     error = pyqtSignal(str)
 
-    def __init__(self, comfy_path: str, first_launch: bool = False):
+    def __init__(
+        self,
+        comfy_path: str,
+        first_launch: bool = False,
+        instance_id: str = DEFAULT_INSTANCE,
+    ):
         super().__init__()
         self.comfy_path = comfy_path
         self.first_launch = first_launch
+        self.instance_id = instance_id
         self._running = True
 
     def stop(self):
@@ -26,29 +32,24 @@ class ComfyLoaderWorker(QObject):
         """
         Main logic:
         - ComfyUI start
-        - port wait
+        - wait for the "server started" console marker (port polling without a console)
         - result signal
         """
         try:
             self.started.emit()
 
             # 1️⃣ Launch ComfyUI (if it's already running, the function will figure it out automatically)
-            ensure_comfyui_running(self.comfy_path)
+            ensure_comfyui_running(self.comfy_path, instance_id=self.instance_id)
 
             # 2️⃣ We're waiting for the server to go up.
-            start_time = time.time()
-
-            while self._running:
-                if is_port_open(COMFYUI_PORT):
-                    self.ready.emit()
-                    return
-
-                # We use timeout ONLY if this is not the first launch.
-                if not self.first_launch and time.time() - start_time > MAX_WAIT_TIME:
-                    self.timeout.emit()
-                    return
-
-                time.sleep(0.3)
+            # We use timeout ONLY if this is not the first launch.
+            timeout = None if self.first_launch else MAX_WAIT_TIME
+            if wait_until_ready(
+                self.instance_id, timeout, cancelled=lambda: not self._running
+            ):
+                self.ready.emit()
+            elif self._running:
+                self.timeout.emit()
 
         except Exception as e:
             self.error.emit(str(e))
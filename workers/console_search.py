@@ -0,0 +1,66 @@
+from PyQt6.QtCore import QObject, pyqtSignal
+import time
+
+from utils.console_buffer import ConsoleBuffer
+from utils.console_search import iter_history, iter_matches
+
+
+class ConsoleSearchWorker(QObject):
+    # ── Signals ─────────────────────────────
+    results = pyqtSignal(list)
+    finished = pyqtSignal(int)
+
+    BATCH_LINES = 500
+    BATCH_SECONDS = 0.1
+    MAX_RESULTS = 10000
+
+    def __init__(
+        self,
+        query: str,
+        preset: str | None = None,
+        buffer: type[ConsoleBuffer] = ConsoleBuffer,
+    ):
+        super().__init__()
+        self.query = query
+        self.preset = preset
+        self.buffer = buffer
+        self._running = True
+
+    def stop(self):
+        """Cancels the scan at the next line."""
+        self._running = False
+
+    def run(self):
+        """
+        Scans the console history and streams matches back in batches,
+        so the first results show up long before a large session is done.
+        """
+        found = 0
+        batch = []
+        last_emit = time.monotonic()
+
+        for line in iter_matches(self.query, self.preset, self._history()):
+            batch.append(line)
+            found += 1
+
+            if (
+                len(batch) >= self.BATCH_LINES
+                or time.monotonic() - last_emit >= self.BATCH_SECONDS
+            ):
+                self.results.emit(batch)
+                batch = []
+                last_emit = time.monotonic()
+
+            if found >= self.MAX_RESULTS:
+                break
+
+        if batch and self._running:
+            self.results.emit(batch)
+        self.finished.emit(found)
+
+    def _history(self):
+        # Checked per scanned line, so a cancel lands even when nothing matches
+        for line in iter_history(self.buffer):
+            if not self._running:
+                return
+            yield line